@@ -787,6 +787,13 @@ def _ensure_worker_running() -> None:
     if state.worker.running:
         return
     state.worker.start()
+
+
+def _wake_worker() -> None:
+    if state.worker:
+        state.worker.notify()
+
+
 def _auto_prompt_generator(lmstudio_url: str | None = None) -> AutoPromptGenerator:
     return AutoPromptGenerator(lmstudio_url=lmstudio_url or state.lmstudio_url)
 
@@ -845,6 +852,7 @@ def _enqueue_job_from_files(
         move_processed=bool(move_processed),
     )
     state.db.touch_input_dir_history(input_dir)
+    _wake_worker()
     return {"job_id": job_id, "job_name": (str(job_name).strip() if job_name else None), "prompt_count": len(specs), "input_dir": input_dir}
 
 
@@ -958,6 +966,7 @@ def retry_job(job_id: int) -> dict[str, Any]:
     detail = state.db.retry_job(job_id)
     if not detail:
         raise HTTPException(status_code=404, detail="job not found")
+    _wake_worker()
     return detail
 
 
@@ -971,6 +980,7 @@ def queue_pause() -> dict[str, Any]:
 def queue_resume() -> dict[str, Any]:
     state.db.resume()
     _ensure_worker_running()
+    _wake_worker()
     return {"worker": "running"}
 
 
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
+import functools
+import http.client
 import json
-import socket
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
 from typing import Any
 
 
@@ -29,9 +29,74 @@ class ComfyTimeoutError(ComfyError):
     pass
 
 
+# Completed /history entries are large (graph echo + outputs). Keep the parsed entry
+# for the get_outputs() call that follows completion instead of fetching it again.
+_COMPLETED_ENTRY_LIMIT = 64
+_completed_entries: dict[tuple[str, str], dict[str, Any]] = {}
+_completed_entries_lock = threading.Lock()
 
-def _url(base_url: str, path: str) -> str:
-    return f"{base_url.rstrip('/')}{path}"
+_ERROR_DETAIL_KEYS = ("error", "message", "details", "node_errors", "exception_message")
+_MISSING = object()
+
+# One keep-alive connection per (thread, scheme, host) instead of a new TCP
+# connection for every poll.
+_REQUEST_TIMEOUT_S = 15
+_STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+_local = threading.local()
+
+# Bursty /queue lookups within the TTL share one HTTP call per base_url.
+_QUEUE_IDS_TTL_S = 0.5
+# Entries are immutable and only ever replaced under the lock; history-pool threads update them too.
+_queue_ids_cache: dict[str, tuple[float, frozenset[str]]] = {}
+_queue_ids_lock = threading.Lock()
+
+
+
+def _open_connection(scheme: str, netloc: str) -> http.client.HTTPConnection:
+    if scheme == "https":
+        return http.client.HTTPSConnection(netloc, timeout=_REQUEST_TIMEOUT_S)
+    return http.client.HTTPConnection(netloc, timeout=_REQUEST_TIMEOUT_S)
+
+
+
+def _send(method: str, base_url: str, path: str, body: bytes | None, headers: dict[str, str]) -> tuple[int, bytes]:
+    parts = urllib.parse.urlsplit(base_url)
+    key = (parts.scheme, parts.netloc)
+    target = f"{parts.path.rstrip('/')}{path}"
+    conns: dict[tuple[str, str], http.client.HTTPConnection] | None = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    while True:
+        conn = conns.get(key)
+        if conn is not None and method not in _IDEMPOTENT_METHODS:
+            # A POST /prompt that fails after sending may already be queued and cannot be replayed,
+            # so it never goes out on a kept-alive socket the server might have dropped.
+            conn.close()
+            conn = None
+        reused = conn is not None
+        if conn is None:
+            conn = conns[key] = _open_connection(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, target, body=body, headers=headers)
+            resp = conn.getresponse()
+            return resp.status, resp.read()
+        except (http.client.HTTPException, OSError) as exc:
+            conn.close()
+            conns.pop(key, None)
+            # Retry once on a fresh connection when the server dropped an idle keep-alive socket.
+            if not reused or not isinstance(exc, _STALE_CONNECTION_ERRORS):
+                raise
+
+
+
+@functools.lru_cache(maxsize=1024)
+def _quote_prompt_id(prompt_id: str) -> str:
+    # Comfy prompt ids are ASCII UUIDs, which quote() would return unchanged.
+    if prompt_id.isascii() and prompt_id.replace("-", "").isalnum():
+        return prompt_id
+    return urllib.parse.quote(prompt_id)
 
 
 
@@ -39,14 +104,19 @@ def _extract_error_detail(payload: Any) -> str:
     if isinstance(payload, str):
         return payload
     if isinstance(payload, dict):
+        if len(payload) == 1:
+            err = payload.get("error")
+            if isinstance(err, str):
+                return err
         parts: list[str] = []
-        for key in ("error", "message", "details", "node_errors", "exception_message"):
-            if key in payload:
-                val = payload[key]
-                if isinstance(val, (dict, list)):
-                    parts.append(json.dumps(val, ensure_ascii=True))
-                else:
-                    parts.append(str(val))
+        for key in _ERROR_DETAIL_KEYS:
+            val = payload.get(key, _MISSING)
+            if val is _MISSING:
+                continue
+            if isinstance(val, (dict, list)):
+                parts.append(json.dumps(val, ensure_ascii=True))
+            else:
+                parts.append(str(val))
         if parts:
             return " | ".join(parts)
         return json.dumps(payload, ensure_ascii=True)
@@ -56,6 +126,20 @@ def _extract_error_detail(payload: Any) -> str:
 
 
 
+def _remember_completed_entry(base_url: str, prompt_id: str, entry: dict[str, Any]) -> None:
+    status = entry.get("status")
+    if not isinstance(status, dict) or not status.get("completed"):
+        return
+    key = (base_url, prompt_id)
+    # The worker fetches history from a thread pool, so all access goes through the lock.
+    with _completed_entries_lock:
+        _completed_entries.pop(key, None)
+        while len(_completed_entries) >= _COMPLETED_ENTRY_LIMIT:
+            _completed_entries.pop(next(iter(_completed_entries)), None)
+        _completed_entries[key] = entry
+
+
+
 def _request_json(method: str, base_url: str, path: str, payload: dict[str, Any] | None = None) -> Any:
     req_data = None
     headers = {}
@@ -63,30 +147,30 @@ def _request_json(method: str, base_url: str, path: str, payload: dict[str, Any]
         req_data = json.dumps(payload).encode("utf-8")
         headers["Content-Type"] = "application/json"
 
-    req = urllib.request.Request(_url(base_url, path), data=req_data, headers=headers, method=method)
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            body = resp.read()
-            if not body:
-                return {}
-            return json.loads(body)
-    except urllib.error.HTTPError as exc:
-        body = exc.read().decode("utf-8", errors="replace")
-        payload_obj: Any
-        try:
-            payload_obj = json.loads(body)
-        except json.JSONDecodeError:
-            payload_obj = body
-
-        detail = _extract_error_detail(payload_obj)
-        if exc.code == 400:
-            raise ComfyValidationError(detail) from exc
-        if 500 <= exc.code < 600:
-            raise ComfyServerError(f"HTTP {exc.code}: {detail}") from exc
-        raise ComfyError(f"HTTP {exc.code}: {detail}") from exc
-    except (urllib.error.URLError, TimeoutError, socket.timeout, ConnectionRefusedError) as exc:
+        code, body = _send(method, base_url, path, req_data, headers)
+    except (http.client.HTTPException, OSError) as exc:
         raise ComfyUnreachableError(str(exc)) from exc
 
+    if 200 <= code < 300:
+        if not body:
+            return {}
+        return json.loads(body)
+
+    text = body.decode("utf-8", errors="replace")
+    payload_obj: Any
+    try:
+        payload_obj = json.loads(text)
+    except json.JSONDecodeError:
+        payload_obj = text
+
+    detail = _extract_error_detail(payload_obj)
+    if code == 400:
+        raise ComfyValidationError(detail)
+    if 500 <= code < 600:
+        raise ComfyServerError(f"HTTP {code}: {detail}")
+    raise ComfyError(f"HTTP {code}: {detail}")
+
 
 
 def health_check(base_url: str) -> bool:
@@ -103,18 +187,37 @@ def queue_prompt(base_url: str, prompt_json: dict[str, Any]) -> str:
     prompt_id = data.get("prompt_id") if isinstance(data, dict) else None
     if not prompt_id:
         raise ComfyError(f"Comfy response did not include prompt_id: {data}")
+    with _queue_ids_lock:
+        cached = _queue_ids_cache.get(base_url)
+        if cached is not None:
+            _queue_ids_cache[base_url] = (cached[0], cached[1] | {str(prompt_id)})
     return str(prompt_id)
 
 
 def get_history_entry(base_url: str, prompt_id: str) -> dict[str, Any] | None:
-    history = _request_json("GET", base_url, f"/history/{urllib.parse.quote(prompt_id)}")
+    history = _request_json("GET", base_url, f"/history/{_quote_prompt_id(prompt_id)}")
     if not isinstance(history, dict):
         return None
     entry = history.get(prompt_id)
-    return entry if isinstance(entry, dict) else None
+    if not isinstance(entry, dict):
+        return None
+    # Comfy writes history once a prompt leaves its queue (finished, failed or interrupted),
+    # so a cached /queue listing must stop reporting it as active.
+    with _queue_ids_lock:
+        cached = _queue_ids_cache.get(base_url)
+        if cached is not None and prompt_id in cached[1]:
+            _queue_ids_cache[base_url] = (cached[0], cached[1] - {prompt_id})
+    _remember_completed_entry(base_url, prompt_id, entry)
+    return entry
 
 
 def get_queue_prompt_ids(base_url: str) -> set[str]:
+    now = time.monotonic()
+    with _queue_ids_lock:
+        cached = _queue_ids_cache.get(base_url)
+    if cached is not None and (now - cached[0]) < _QUEUE_IDS_TTL_S:
+        return set(cached[1])
+
     data = _request_json("GET", base_url, "/queue")
     if not isinstance(data, dict):
         return set()
@@ -131,6 +234,8 @@ def get_queue_prompt_ids(base_url: str) -> set[str]:
             if pid is None:
                 continue
             out.add(str(pid))
+    with _queue_ids_lock:
+        _queue_ids_cache[base_url] = (now, frozenset(out))
     return out
 
 
@@ -142,7 +247,7 @@ def poll_until_done(
     timeout: float = 7200.0,
 ) -> tuple[bool, str]:
     start = time.time()
-    encoded = urllib.parse.quote(prompt_id)
+    encoded = _quote_prompt_id(prompt_id)
 
     while True:
         history = _request_json("GET", base_url, f"/history/{encoded}")
@@ -152,6 +257,7 @@ def poll_until_done(
             completed = bool(status.get("completed", False))
             status_str = str(status.get("status_str", "unknown"))
             if completed:
+                _remember_completed_entry(base_url, prompt_id, entry)
                 return True, status_str
             if status_str in {"error", "failed", "canceled"}:
                 return False, status_str
@@ -163,11 +269,14 @@ def poll_until_done(
 
 
 def get_outputs(base_url: str, prompt_id: str) -> list[str]:
-    history = _request_json("GET", base_url, f"/history/{urllib.parse.quote(prompt_id)}")
-    if not isinstance(history, dict) or prompt_id not in history:
-        return []
+    with _completed_entries_lock:
+        entry = _completed_entries.pop((base_url, prompt_id), None)
+    if entry is None:
+        history = _request_json("GET", base_url, f"/history/{_quote_prompt_id(prompt_id)}")
+        if not isinstance(history, dict) or prompt_id not in history:
+            return []
+        entry = history[prompt_id] or {}
 
-    entry = history[prompt_id] or {}
     outputs = entry.get("outputs") or {}
     if not isinstance(outputs, dict):
         return []
@@ -2,96 +2,123 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+_UTC = timezone.utc
+_PROMPT_INSERT_CHUNK = 200
+# Job status aggregation uses UPDATE ... FROM (3.33) and RETURNING (3.35).
+_MIN_SQLITE_VERSION = (3, 35, 0)
+# Built prompts are plain acyclic trees; skipping the cycle-tracking pass is byte-identical to json.dumps.
+_encode_prompt = json.JSONEncoder(check_circular=False).encode
+
+# One transaction for the whole DDL script instead of an autocommit (and journal sync) per statement.
+_SCHEMA_SQL = """
+BEGIN;
+CREATE TABLE IF NOT EXISTS jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  workflow_name TEXT NOT NULL,
+  job_name TEXT,
+  status TEXT NOT NULL,
+  cancel_requested INTEGER NOT NULL DEFAULT 0,
+  priority INTEGER NOT NULL DEFAULT 0,
+  input_dir TEXT NOT NULL,
+  params_json TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  started_at TEXT,
+  finished_at TEXT,
+  last_error TEXT,
+  log_path TEXT,
+  move_processed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS prompts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+  input_file TEXT NOT NULL,
+  prompt_json TEXT NOT NULL,
+  status TEXT NOT NULL,
+  prompt_id TEXT,
+  started_at TEXT,
+  finished_at TEXT,
+  exit_status TEXT,
+  error_detail TEXT,
+  output_paths TEXT,
+  seed_used INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS queue_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  paused INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS input_dir_history (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  path TEXT NOT NULL UNIQUE,
+  last_used_at TEXT NOT NULL,
+  use_count INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS prompt_presets (
+  name TEXT PRIMARY KEY,
+  mode TEXT NOT NULL DEFAULT 'video_gen',
+  positive_prompt TEXT NOT NULL DEFAULT '',
+  negative_prompt TEXT NOT NULL DEFAULT '',
+  updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings_presets (
+  name TEXT PRIMARY KEY,
+  payload_json TEXT NOT NULL,
+  updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_input_dir_history_last_used
+  ON input_dir_history(last_used_at DESC);
+CREATE INDEX IF NOT EXISTS idx_prompt_presets_updated_at
+  ON prompt_presets(updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_settings_presets_updated_at
+  ON settings_presets(updated_at DESC);
+
+INSERT OR IGNORE INTO queue_state (id, paused) VALUES (1, 0);
+COMMIT;
+"""
 
 
 def utc_now() -> str:
-    from datetime import datetime, timezone
-
-    return datetime.now(timezone.utc).isoformat()
+    return datetime.now(_UTC).isoformat()
 
 
 class QueueDB:
     def __init__(self, db_path: str | Path | None = None) -> None:
-        self.db_path = Path(db_path).expanduser() if db_path else Path.home() / "video_queue" / "data" / "queue.db"
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if sqlite3.sqlite_version_info < _MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {'.'.join(map(str, _MIN_SQLITE_VERSION))}+ is required, "
+                f"but Python is linked against SQLite {sqlite3.sqlite_version}"
+            )
+        self.db_path: str | Path
+        if isinstance(db_path, str) and (db_path == ":memory:" or db_path.startswith("file:")):
+            # In-memory or URI databases (e.g. "file:name?mode=memory&cache=shared") have no directory to create.
+            self.db_path = db_path
+            self.conn = sqlite3.connect(db_path, uri=True, check_same_thread=False)
+        else:
+            self.db_path = Path(db_path).expanduser() if db_path else Path.home() / "video_queue" / "data" / "queue.db"
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA wal_autocheckpoint=1000")
         self.conn.execute("PRAGMA foreign_keys=ON")
+        # API threads and the worker share this connection; transactions hold the lock end to end.
+        self._lock = threading.RLock()
+        self._txn_depth = 0
         self._init_schema()
 
     def _init_schema(self) -> None:
-        self.conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS jobs (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              workflow_name TEXT NOT NULL,
-              job_name TEXT,
-              status TEXT NOT NULL,
-              cancel_requested INTEGER NOT NULL DEFAULT 0,
-              priority INTEGER NOT NULL DEFAULT 0,
-              input_dir TEXT NOT NULL,
-              params_json TEXT NOT NULL,
-              created_at TEXT NOT NULL,
-              started_at TEXT,
-              finished_at TEXT,
-              last_error TEXT,
-              log_path TEXT,
-              move_processed INTEGER NOT NULL DEFAULT 0
-            );
-
-            CREATE TABLE IF NOT EXISTS prompts (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
-              input_file TEXT NOT NULL,
-              prompt_json TEXT NOT NULL,
-              status TEXT NOT NULL,
-              prompt_id TEXT,
-              started_at TEXT,
-              finished_at TEXT,
-              exit_status TEXT,
-              error_detail TEXT,
-              output_paths TEXT,
-              seed_used INTEGER
-            );
-
-            CREATE TABLE IF NOT EXISTS queue_state (
-              id INTEGER PRIMARY KEY CHECK (id = 1),
-              paused INTEGER NOT NULL DEFAULT 0
-            );
-
-            CREATE TABLE IF NOT EXISTS input_dir_history (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              path TEXT NOT NULL UNIQUE,
-              last_used_at TEXT NOT NULL,
-              use_count INTEGER NOT NULL DEFAULT 1
-            );
-
-            CREATE TABLE IF NOT EXISTS prompt_presets (
-              name TEXT PRIMARY KEY,
-              mode TEXT NOT NULL DEFAULT 'video_gen',
-              positive_prompt TEXT NOT NULL DEFAULT '',
-              negative_prompt TEXT NOT NULL DEFAULT '',
-              updated_at TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS settings_presets (
-              name TEXT PRIMARY KEY,
-              payload_json TEXT NOT NULL,
-              updated_at TEXT NOT NULL
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_input_dir_history_last_used
-              ON input_dir_history(last_used_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_prompt_presets_updated_at
-              ON prompt_presets(updated_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_settings_presets_updated_at
-              ON settings_presets(updated_at DESC);
-
-            INSERT OR IGNORE INTO queue_state (id, paused) VALUES (1, 0);
-            """
-        )
+        self.conn.executescript(_SCHEMA_SQL)
         job_cols = {str(row["name"]) for row in self.conn.execute("PRAGMA table_info(jobs)").fetchall()}
         if "cancel_requested" not in job_cols:
             self.conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
@@ -105,17 +132,45 @@ class QueueDB:
     def close(self) -> None:
         self.conn.close()
 
+    @contextmanager
+    def _txn(self) -> Iterator[None]:
+        # Groups writes into one BEGIN IMMEDIATE transaction (one WAL commit). Every writer goes
+        # through here so another thread's writes can never land in, or commit, an open transaction;
+        # nested use on the owning thread joins the outer transaction.
+        with self._lock:
+            if self._txn_depth:
+                self._txn_depth += 1
+                try:
+                    yield
+                finally:
+                    self._txn_depth -= 1
+                return
+
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._txn_depth = 1
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                self._txn_depth = 0
+
     def is_paused(self) -> bool:
         row = self.conn.execute("SELECT paused FROM queue_state WHERE id=1").fetchone()
         return bool(row["paused"]) if row else False
 
     def pause(self) -> None:
-        self.conn.execute("UPDATE queue_state SET paused=1 WHERE id=1")
-        self.conn.commit()
+        with self._txn():
+            self.conn.execute("UPDATE queue_state SET paused=1 WHERE id=1")
 
     def resume(self) -> None:
-        self.conn.execute("UPDATE queue_state SET paused=0 WHERE id=1")
-        self.conn.commit()
+        with self._txn():
+            self.conn.execute("UPDATE queue_state SET paused=0 WHERE id=1")
 
     def create_job(
         self,
@@ -128,7 +183,7 @@ class QueueDB:
         move_processed: bool = False,
     ) -> int:
         created = utc_now()
-        with self.conn:
+        with self._txn():
             cur = self.conn.execute(
                 """
                 INSERT INTO jobs (
@@ -138,22 +193,23 @@ class QueueDB:
                 (workflow_name, job_name, priority, input_dir, json.dumps(params_json), created, int(move_processed)),
             )
             job_id = int(cur.lastrowid)
-            for spec in prompt_specs:
-                self.conn.execute(
-                    """
-                    INSERT INTO prompts (
-                        job_id, input_file, prompt_json, status, output_paths, seed_used
-                    ) VALUES (?, ?, ?, 'pending', '[]', ?)
-                    """,
-                    (
-                        job_id,
-                        str(spec.input_file),
-                        json.dumps(spec.prompt_json),
-                        spec.seed_used,
-                    ),
-                )
+            self._insert_prompts(job_id, prompt_specs)
         return job_id
 
+    def _insert_prompts(self, job_id: int, prompt_specs: list[Any]) -> None:
+        # Multi-row VALUES is one parse/plan per chunk; chunks stay under SQLite's
+        # legacy 999 bound-variable limit.
+        for start in range(0, len(prompt_specs), _PROMPT_INSERT_CHUNK):
+            chunk = prompt_specs[start : start + _PROMPT_INSERT_CHUNK]
+            values: list[Any] = []
+            for spec in chunk:
+                values.extend((job_id, str(spec.input_file), _encode_prompt(spec.prompt_json), spec.seed_used))
+            self.conn.execute(
+                "INSERT INTO prompts (job_id, input_file, prompt_json, status, output_paths, seed_used) VALUES "
+                + ",".join(["(?, ?, ?, 'pending', '[]', ?)"] * len(chunk)),
+                values,
+            )
+
     def next_pending_prompt(self, job_id: int | None = None) -> dict[str, Any] | None:
         if self.is_paused():
             return None
@@ -177,6 +233,20 @@ class QueueDB:
         ).fetchone()
         return dict(row) if row else None
 
+    def claim_next_prompt(self) -> dict[str, Any] | None:
+        # Pick + mark-running in one transaction so API writes (cancel, clear) cannot interleave.
+        # This is not a multi-worker claim protocol: the queue is drained by the app's single Worker.
+        now = utc_now()
+        with self._txn():
+            row = self.next_pending_prompt()
+            if not row:
+                return None
+            self.conn.execute("UPDATE prompts SET status='running', started_at=? WHERE id=?", (now, row["id"]))
+            self.update_job_status(int(row["job_id"]), now=now)
+        row["status"] = "running"
+        row["started_at"] = now
+        return row
+
     def update_prompt_status(self, prompt_row_id: int, status: str, **fields: Any) -> None:
         allowed = {
             "prompt_id",
@@ -196,64 +266,83 @@ class QueueDB:
                 values.append(value)
 
         values.append(prompt_row_id)
-        self.conn.execute(f"UPDATE prompts SET {', '.join(sets)} WHERE id=?", values)
-        self.conn.commit()
+        with self._txn():
+            self.conn.execute(f"UPDATE prompts SET {', '.join(sets)} WHERE id=?", values)
 
-    def _job_prompt_counts(self, job_id: int) -> dict[str, int]:
-        rows = self.conn.execute(
-            "SELECT status, COUNT(*) AS c FROM prompts WHERE job_id=? GROUP BY status", (job_id,)
-        ).fetchall()
-        counts = {row["status"]: int(row["c"]) for row in rows}
-        counts.setdefault("pending", 0)
-        counts.setdefault("running", 0)
-        counts.setdefault("succeeded", 0)
-        counts.setdefault("failed", 0)
-        counts.setdefault("canceled", 0)
-        return counts
-
-    def update_job_status(self, job_id: int) -> str:
-        counts = self._job_prompt_counts(job_id)
-        total = sum(counts.values())
+    def update_job_status(self, job_id: int, now: str | None = None) -> str:
+        now = now or utc_now()
+        with self._txn():
+            row = self.conn.execute(
+                """
+                UPDATE jobs
+                SET status=agg.status,
+                    started_at=COALESCE(
+                        jobs.started_at,
+                        CASE WHEN agg.status IN ('running','succeeded','failed','canceled') THEN ? END
+                    ),
+                    finished_at=CASE WHEN agg.status IN ('succeeded','failed','canceled') THEN ? END
+                FROM (
+                    SELECT CASE
+                        WHEN COUNT(*)=0 THEN 'pending'
+                        WHEN SUM(p.status='running')>0 THEN 'running'
+                        WHEN SUM(p.status='pending')>0 THEN 'pending'
+                        WHEN SUM(p.status='failed')>0 THEN 'failed'
+                        WHEN SUM(p.status='succeeded')=COUNT(*) THEN 'succeeded'
+                        WHEN SUM(p.status='canceled')=COUNT(*) THEN 'canceled'
+                        WHEN SUM(p.status='succeeded')>0 AND SUM(p.status='canceled')>0 AND (
+                            SELECT COALESCE(cancel_requested, 0) FROM jobs WHERE id=?
+                        ) THEN 'canceled'
+                        ELSE 'succeeded'
+                    END AS status
+                    FROM prompts p
+                    WHERE p.job_id=?
+                ) AS agg
+                WHERE jobs.id=?
+                RETURNING jobs.status
+                """,
+                (now, now, job_id, job_id, job_id),
+            ).fetchone()
+        return str(row["status"]) if row else "pending"
+
+    def update_prompt_and_job_status(self, prompt_row_id: int, job_id: int, status: str, **fields: Any) -> str:
+        now = fields.get("finished_at") or fields.get("started_at")
+        with self._txn():
+            self.update_prompt_status(prompt_row_id, status, **fields)
+            return self.update_job_status(job_id, now=now)
+
+    def finalize_prompt(self, prompt_row_id: int, job_id: int, status: str, *, log_path: str, **fields: Any) -> str:
+        # Terminal bookkeeping for one executed prompt in a single commit: prompt row, job log path,
+        # cancel-after-current sweep and the recomputed job status.
+        with self._txn():
+            self.update_prompt_status(prompt_row_id, status, **fields)
+            row = self.conn.execute(
+                "UPDATE jobs SET log_path=? WHERE id=? RETURNING COALESCE(cancel_requested, 0) AS cancel_requested",
+                (log_path, job_id),
+            ).fetchone()
+            if row and row["cancel_requested"]:
+                self.cancel_pending_prompts(job_id)
+            return self.update_job_status(job_id, now=fields.get("finished_at"))
+
+    def try_cancel_pending(self, prompt_row_id: int, job_id: int) -> bool:
+        # Cancels a just-dequeued prompt if its job asked for cancellation, without a separate flag read.
         now = utc_now()
-        job_row = self.conn.execute(
-            "SELECT started_at, COALESCE(cancel_requested, 0) AS cancel_requested FROM jobs WHERE id=?",
-            (job_id,),
-        ).fetchone()
-        if not job_row:
-            return "pending"
-        cancel_requested = bool(job_row["cancel_requested"])
-
-        if total == 0:
-            status = "pending"
-        elif counts["running"] > 0:
-            status = "running"
-        elif counts["pending"] > 0:
-            status = "pending"
-        elif counts["failed"] > 0:
-            status = "failed"
-        elif counts["succeeded"] == total:
-            status = "succeeded"
-        elif counts["canceled"] == total:
-            status = "canceled"
-        elif counts["succeeded"] > 0 and counts["canceled"] > 0 and cancel_requested:
-            status = "canceled"
-        else:
-            status = "succeeded"
-
-        started_at = job_row["started_at"]
-        started_val = started_at if started_at else (now if status in {"running", "succeeded", "failed", "canceled"} else None)
-        finished_val = now if status in {"succeeded", "failed", "canceled"} else None
-
-        self.conn.execute(
-            "UPDATE jobs SET status=?, started_at=COALESCE(started_at, ?), finished_at=? WHERE id=?",
-            (status, started_val, finished_val, job_id),
-        )
-        self.conn.commit()
-        return status
+        with self._txn():
+            cur = self.conn.execute(
+                """
+                UPDATE prompts
+                SET status='canceled', started_at=NULL, finished_at=?, error_detail='canceled before execution'
+                WHERE id=? AND EXISTS (SELECT 1 FROM jobs WHERE id=? AND cancel_requested=1)
+                """,
+                (now, prompt_row_id, job_id),
+            )
+            if not cur.rowcount:
+                return False
+            self.update_job_status(job_id, now=now)
+        return True
 
     def recover_interrupted(self) -> None:
         now = utc_now()
-        with self.conn:
+        with self._txn():
             self.conn.execute(
                 """
                 UPDATE prompts
@@ -265,7 +354,7 @@ class QueueDB:
             )
             jobs = self.conn.execute("SELECT DISTINCT job_id FROM prompts WHERE exit_status='interrupted'").fetchall()
             for row in jobs:
-                self.update_job_status(int(row["job_id"]))
+                self.update_job_status(int(row["job_id"]), now=now)
 
     def list_running_prompts(self) -> list[dict[str, Any]]:
         rows = self.conn.execute(
@@ -306,15 +395,19 @@ class QueueDB:
         ).fetchall()
         return [dict(r) for r in rows]
 
+    def get_job_row(self, job_id: int) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
     def get_job(self, job_id: int) -> dict[str, Any] | None:
-        job = self.conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        job = self.get_job_row(job_id)
         if not job:
             return None
         prompts = self.conn.execute(
             "SELECT * FROM prompts WHERE job_id=? ORDER BY id ASC", (job_id,)
         ).fetchall()
         return {
-            "job": dict(job),
+            "job": job,
             "prompts": [dict(p) for p in prompts],
         }
 
@@ -324,10 +417,11 @@ class QueueDB:
             return None
 
         canceled_pending = 0
-        with self.conn:
+        now = utc_now()
+        with self._txn():
             cur = self.conn.execute(
                 "UPDATE prompts SET status='canceled', finished_at=? WHERE job_id=? AND status='pending'",
-                (utc_now(), job_id),
+                (now, job_id),
             )
             canceled_pending = int(cur.rowcount or 0)
             self.conn.execute("UPDATE jobs SET cancel_requested=1 WHERE id=?", (job_id,))
@@ -339,7 +433,7 @@ class QueueDB:
             ).fetchone()["c"]
             or 0
         )
-        self.update_job_status(job_id)
+        self.update_job_status(job_id, now=now)
         detail = self.get_job(job_id)
         if not detail:
             return None
@@ -352,7 +446,7 @@ class QueueDB:
         return detail
 
     def retry_job(self, job_id: int) -> dict[str, Any] | None:
-        with self.conn:
+        with self._txn():
             self.conn.execute(
                 """
                 UPDATE prompts
@@ -377,7 +471,7 @@ class QueueDB:
         return bool(row["cancel_requested"]) if row else False
 
     def cancel_pending_prompts(self, job_id: int) -> int:
-        with self.conn:
+        with self._txn():
             cur = self.conn.execute(
                 "UPDATE prompts SET status='canceled', finished_at=? WHERE job_id=? AND status='pending'",
                 (utc_now(), job_id),
@@ -409,7 +503,7 @@ class QueueDB:
         jobs_count = int(row["jobs_count"] or 0)
         prompts_count = int(row["prompts_count"] or 0)
 
-        with self.conn:
+        with self._txn():
             self.conn.execute("DELETE FROM jobs")
 
         return {
@@ -419,7 +513,7 @@ class QueueDB:
 
     def touch_input_dir_history(self, path: str) -> None:
         now = utc_now()
-        with self.conn:
+        with self._txn():
             self.conn.execute(
                 """
                 INSERT INTO input_dir_history (path, last_used_at, use_count)
@@ -504,7 +598,7 @@ class QueueDB:
         if not clean_mode:
             clean_mode = "video_gen"
         now = utc_now()
-        with self.conn:
+        with self._txn():
             self.conn.execute(
                 """
                 INSERT INTO prompt_presets (name, mode, positive_prompt, negative_prompt, updated_at)
@@ -560,7 +654,7 @@ class QueueDB:
 
         now = utc_now()
         payload_json = json.dumps(payload)
-        with self.conn:
+        with self._txn():
             self.conn.execute(
                 """
                 INSERT INTO settings_presets (name, payload_json, updated_at)
@@ -1,27 +1,130 @@
 from __future__ import annotations
 
 import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from dataclasses import field as dataclass_field
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 import yaml
 
 ALLOWED_PARAM_TYPES = {"text", "bool", "int", "float"}
 
+# libyaml's C parser when PyYAML was built with it; same safe constructors either way.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Inputs prompt_builder sets outside bindings/parameters (custom prompt composition, WAN LoRA chaining).
+_IMPLICIT_INPUT_WRITES = frozenset({"prompt", "model"})
+
+_MISSING = object()
+
+
+# load_all() reuses a WorkflowDef while its YAML (and template JSON) signature is unchanged.
+_FileSignature = tuple[int, int]
+_LOAD_CACHE: dict[Path, tuple[_FileSignature, _FileSignature | None, WorkflowDef]] = {}
+_LOAD_CACHE_LOCK = threading.Lock()
+_LOAD_WORKERS = min(8, os.cpu_count() or 4)
+
+# Compact template JSON -> (that string, parsed prompt), shared by every WorkflowDef with the same template.
+_TEMPLATE_PROMPTS: dict[str, tuple[str, dict[str, Any]]] = {}
+
 
 class WorkflowDefError(ValueError):
     pass
 
 
-@dataclass(frozen=True)
+
+def _make_coercer(
+    name: str,
+    ptype: str,
+    minimum: int | float | None,
+    maximum: int | float | None,
+) -> Callable[[Any], Any]:
+    # Built once per parameter so resolve_params() skips the type dispatch and None-bound checks.
+    if ptype == "text":
+        def coerce_text(value: Any) -> str:
+            return "" if value is None else str(value)
+
+        return coerce_text
+
+    if ptype == "bool":
+        def coerce_bool(value: Any) -> bool:
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str):
+                v = value.strip().lower()
+                if v in {"1", "true", "yes", "on"}:
+                    return True
+                if v in {"0", "false", "no", "off"}:
+                    return False
+            raise ValueError(f"parameter '{name}' must be bool")
+
+        return coerce_bool
+
+    if ptype == "int":
+        def convert(value: Any) -> int | float:
+            if isinstance(value, bool):
+                raise ValueError(f"parameter '{name}' must be int")
+            try:
+                return int(value)
+            except Exception as exc:
+                raise ValueError(f"parameter '{name}' must be int") from exc
+    elif ptype == "float":
+        def convert(value: Any) -> int | float:
+            try:
+                return float(value)
+            except Exception as exc:
+                raise ValueError(f"parameter '{name}' must be float") from exc
+    else:
+        def unsupported(value: Any) -> Any:
+            raise ValueError(f"unsupported parameter type: {ptype}")
+
+        return unsupported
+
+    if minimum is None and maximum is None:
+        return convert
+
+    if maximum is None:
+        def coerce_min(value: Any) -> int | float:
+            out = convert(value)
+            if out < minimum:
+                raise ValueError(f"parameter '{name}' below min {minimum}")
+            return out
+
+        return coerce_min
+
+    if minimum is None:
+        def coerce_max(value: Any) -> int | float:
+            out = convert(value)
+            if out > maximum:
+                raise ValueError(f"parameter '{name}' above max {maximum}")
+            return out
+
+        return coerce_max
+
+    def coerce_range(value: Any) -> int | float:
+        out = convert(value)
+        if out < minimum:
+            raise ValueError(f"parameter '{name}' below min {minimum}")
+        if out > maximum:
+            raise ValueError(f"parameter '{name}' above max {maximum}")
+        return out
+
+    return coerce_range
+
+
+@dataclass(frozen=True, slots=True)
 class NodeBinding:
     nodes: list[str]
     field: str | None = None
     fields: list[str] | None = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ParameterDef:
     name: str
     label: str
@@ -32,16 +135,20 @@ class ParameterDef:
     nodes: list[str] | None = None
     field: str | None = None
     fields: list[str] | None = None
+    _coercer: Callable[[Any], Any] = dataclass_field(init=False, repr=False, compare=False)
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_coercer", _make_coercer(self.name, self.type, self.min, self.max))
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class SwitchState:
     node_id: str
     field: str
     value: Any
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WorkflowDef:
     name: str
     display_name: str | None
@@ -57,6 +164,132 @@ class WorkflowDef:
     move_processed: bool
     template_prompt: dict[str, Any]
     source_file: Path
+    _template_prompt_json: str = dataclass_field(init=False, repr=False, compare=False)
+    _context_window_node_ids: tuple[str, ...] = dataclass_field(init=False, repr=False, compare=False)
+    _resolution_node_ids: tuple[str, ...] = dataclass_field(init=False, repr=False, compare=False)
+    _dimension_node_ids: tuple[str, ...] = dataclass_field(init=False, repr=False, compare=False)
+    _overlay_node_ids: tuple[str, ...] = dataclass_field(init=False, repr=False, compare=False)
+    # prompt_builder's derived build plan, attached on first use.
+    _build_plan: Any = dataclass_field(default=None, init=False, repr=False, compare=False)
+    _binding_targets: dict[str, tuple[tuple[str, str | None], ...]] = dataclass_field(init=False, repr=False, compare=False)
+    _param_targets: dict[str, tuple[tuple[str, str | None], ...]] = dataclass_field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Workflows with identical templates share one prompt object and serialization.
+        template_json = json.dumps(self.template_prompt, separators=(",", ":"))
+        with _LOAD_CACHE_LOCK:
+            template_json, template_prompt = _TEMPLATE_PROMPTS.setdefault(template_json, (template_json, self.template_prompt))
+        object.__setattr__(self, "template_prompt", template_prompt)
+        object.__setattr__(self, "_template_prompt_json", template_json)
+
+        # Which binding, parameter or switch may write which input names, per node.
+        writers: dict[str, list[tuple[object, set[str]]]] = {}
+        for writer in (*self.file_bindings.values(), *self.parameters.values()):
+            names = {name for name in (writer.field, *(writer.fields or ())) if name}
+            for nid in writer.nodes or ():
+                writers.setdefault(nid, []).append((writer, names))
+        for switch in self.switch_states:
+            writers.setdefault(switch.node_id, []).append((switch, {switch.field}))
+
+        # Node indexes for build_prompts' whole-graph fixups, limited to nodes with an inputs dict.
+        # Dimension nodes are those that can hold a numeric width and height once bindings, parameters
+        # and switches are applied. Resolution nodes are the subset that always will, so build_prompts
+        # can skip the per-prompt type checks.
+        context_ids: list[str] = []
+        resolution_ids: list[str] = []
+        dimension_ids: list[str] = []
+        for nid, node in self.template_prompt.items():
+            if not isinstance(node, dict):
+                continue
+            inputs = node.get("inputs")
+            if not isinstance(inputs, dict):
+                inputs = {}
+            elif node.get("class_type") == "WanContextWindowsManual":
+                context_ids.append(nid)
+            dim_writers = [writer for writer, names in writers.get(nid, ()) if "width" in names or "height" in names]
+            template_numeric = [_is_number(inputs.get(key)) for key in ("width", "height")]
+            if all(template_numeric) and all(_writes_number(writer) for writer in dim_writers):
+                resolution_ids.append(nid)
+                continue
+            written = [any(key in names for _, names in writers.get(nid, ())) for key in ("width", "height")]
+            if all(numeric or wrote for numeric, wrote in zip(template_numeric, written)):
+                dimension_ids.append(nid)
+        object.__setattr__(self, "_context_window_node_ids", tuple(context_ids))
+        object.__setattr__(self, "_resolution_node_ids", tuple(resolution_ids))
+        object.__setattr__(self, "_dimension_node_ids", tuple(dimension_ids))
+
+        # Nodes clone_template_prompt() copies; every other node is shared with the template.
+        overlay = set(writers).union(context_ids, resolution_ids, dimension_ids)
+        object.__setattr__(
+            self,
+            "_overlay_node_ids",
+            tuple(nid for nid, node in self.template_prompt.items() if nid in overlay and isinstance(node, dict)),
+        )
+
+        # Input name each binding/parameter writes per node. Field names another writer may add
+        # before this one runs make the choice depend on the prompt, so those targets stay None.
+        def targets(writer: NodeBinding | ParameterDef) -> tuple[tuple[str, str | None], ...]:
+            out: list[tuple[str, str | None]] = []
+            for nid in writer.nodes or ():
+                node = self.template_prompt.get(nid)
+                inputs = node.get("inputs") if isinstance(node, dict) else None
+                if not isinstance(inputs, dict):
+                    out.append((nid, None))
+                    continue
+                added = set(_IMPLICIT_INPUT_WRITES)
+                for other, names in writers.get(nid, ()):
+                    if other is not writer:
+                        added.update(names)
+                out.append((nid, _static_input_target(inputs, writer.field, writer.fields, added)))
+            return tuple(out)
+
+        object.__setattr__(self, "_binding_targets", {name: targets(b) for name, b in self.file_bindings.items()})
+        object.__setattr__(self, "_param_targets", {name: targets(p) for name, p in self.parameters.items()})
+
+    def clone_template_prompt(self) -> dict[str, Any]:
+        # Write overlay: only nodes build_prompts may write get their own node and inputs dicts.
+        # The rest alias template_prompt, which must be treated as read-only.
+        prompt = dict(self.template_prompt)
+        for nid in self._overlay_node_ids:
+            node = prompt[nid] = dict(prompt[nid])
+            inputs = node.get("inputs")
+            if isinstance(inputs, dict):
+                node["inputs"] = dict(inputs)
+        return prompt
+
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+
+def _writes_number(writer: object) -> bool:
+    if isinstance(writer, ParameterDef):
+        return writer.type in ("int", "float")
+    if isinstance(writer, SwitchState):
+        return _is_number(writer.value)
+    return False
+
+
+
+def _static_input_target(
+    inputs: dict[str, Any],
+    preferred: str | None,
+    candidates: list[str] | None,
+    added: set[str],
+) -> str | None:
+    # Mirrors prompt_builder._set_candidate_field against the template inputs.
+    if preferred:
+        return preferred
+    if not candidates:
+        return None
+    for name in candidates:
+        if name in inputs:
+            return name
+        if name in added:
+            return None
+    return candidates[0]
 
 
 
@@ -65,11 +298,27 @@ def _err(path: Path, field: str, msg: str) -> WorkflowDefError:
 
 
 
+def _intern(value: Any) -> Any:
+    # Definition strings become dict keys in every built prompt; interned keys hit the pointer-equality fast path.
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+
+def _intern_list(values: list[str] | None) -> list[str] | None:
+    return [sys.intern(v) for v in values] if values is not None else None
+
+
+
 def _load_template(path: Path, raw: dict[str, Any]) -> tuple[str | None, dict[str, Any]]:
     if "template_inline" in raw:
         inline = raw["template_inline"]
         if not isinstance(inline, dict):
             raise _err(path, "template_inline", "must be a mapping")
+        # Prompts are cloned and stored as JSON, so YAML-only values (dates, recursive anchors) can't be used.
+        try:
+            json.dumps(inline)
+        except (TypeError, ValueError) as exc:
+            raise _err(path, "template_inline", f"must be JSON-serializable: {exc}") from exc
         return None, inline
 
     template = raw.get("template")
@@ -84,7 +333,7 @@ def _load_template(path: Path, raw: dict[str, Any]) -> tuple[str | None, dict[st
         raise _err(path, "template", f"template file does not exist: {template_path}")
 
     try:
-        obj = json.loads(template_path.read_text())
+        obj = json.loads(template_path.read_bytes())
     except json.JSONDecodeError as exc:
         raise _err(path, "template", f"invalid JSON: {exc}") from exc
 
@@ -114,7 +363,7 @@ def _parse_binding(path: Path, name: str, value: Any) -> NodeBinding:
         if not isinstance(fields, list) or not fields or not all(isinstance(f, str) for f in fields):
             raise _err(path, f"file_bindings.{name}.fields", "must be a non-empty list[str]")
 
-    return NodeBinding(nodes=nodes, field=field, fields=fields)
+    return NodeBinding(nodes=_intern_list(nodes), field=_intern(field), fields=_intern_list(fields))
 
 
 
@@ -151,43 +400,46 @@ def _parse_parameter(path: Path, name: str, value: Any) -> ParameterDef:
         raise _err(path, f"parameters.{name}.max", "must be numeric")
 
     return ParameterDef(
-        name=name,
+        name=_intern(name),
         label=label,
         type=ptype,
         default=value.get("default"),
         min=minimum,
         max=maximum,
-        nodes=nodes,
-        field=field,
-        fields=fields,
+        nodes=_intern_list(nodes),
+        field=_intern(field),
+        fields=_intern_list(fields),
     )
 
 
 
 def _validate_template_refs(path: Path, prompt: dict[str, Any], workflow: WorkflowDef) -> None:
-    node_ids = set(prompt.keys())
+    def check(field: str, nid: str) -> None:
+        node = prompt.get(nid, _MISSING)
+        if node is _MISSING:
+            raise _err(path, field, f"node id '{nid}' not in template")
+        # build_prompts writes straight into node["inputs"] for every targeted node.
+        if not isinstance(node, dict) or not isinstance(node.get("inputs"), dict):
+            raise _err(path, field, f"node id '{nid}' has no inputs mapping")
 
     for bname, binding in workflow.file_bindings.items():
         for nid in binding.nodes:
-            if nid not in node_ids:
-                raise _err(path, f"file_bindings.{bname}.nodes", f"node id '{nid}' not in template")
+            check(f"file_bindings.{bname}.nodes", nid)
 
     for pname, param in workflow.parameters.items():
         if not param.nodes:
             continue
         for nid in param.nodes:
-            if nid not in node_ids:
-                raise _err(path, f"parameters.{pname}.nodes", f"node id '{nid}' not in template")
+            check(f"parameters.{pname}.nodes", nid)
 
     for switch in workflow.switch_states:
-        if switch.node_id not in node_ids:
-            raise _err(path, "switch_states", f"node id '{switch.node_id}' not in template")
+        check("switch_states", switch.node_id)
 
 
 
 def load_one(path: Path) -> WorkflowDef:
     try:
-        raw = yaml.safe_load(path.read_text())
+        raw = yaml.load(path.read_bytes(), Loader=_YAML_LOADER)
     except yaml.YAMLError as exc:
         raise WorkflowDefError(f"{path}: invalid YAML: {exc}") from exc
 
@@ -238,7 +490,7 @@ def load_one(path: Path) -> WorkflowDef:
     params_raw = raw.get("parameters", {})
     if not isinstance(params_raw, dict):
         raise _err(path, "parameters", "must be a mapping")
-    parameters = {k: _parse_parameter(path, k, v) for k, v in params_raw.items()}
+    parameters = {_intern(k): _parse_parameter(path, k, v) for k, v in params_raw.items()}
 
     switches_raw = raw.get("switch_states", {})
     if not isinstance(switches_raw, dict):
@@ -252,7 +504,7 @@ def load_one(path: Path) -> WorkflowDef:
             raise _err(path, f"switch_states.{node_id}.field", "must be a string")
         if "value" not in cfg:
             raise _err(path, f"switch_states.{node_id}.value", "is required")
-        switch_states.append(SwitchState(node_id=str(node_id), field=field, value=cfg["value"]))
+        switch_states.append(SwitchState(node_id=sys.intern(str(node_id)), field=sys.intern(field), value=cfg["value"]))
 
     move_processed = bool(raw.get("move_processed", False))
 
@@ -277,17 +529,67 @@ def load_one(path: Path) -> WorkflowDef:
 
 
 
+def _file_signature(path: Path) -> _FileSignature | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+
+def _cached_workflow(path: Path) -> WorkflowDef | None:
+    yaml_sig = _file_signature(path)
+    with _LOAD_CACHE_LOCK:
+        cached = _LOAD_CACHE.get(path)
+    if cached is None or yaml_sig is None:
+        return None
+    cached_yaml_sig, cached_template_sig, cached_wf = cached
+    template_sig = _file_signature(Path(cached_wf.template_path)) if cached_wf.template_path else None
+    if cached_yaml_sig == yaml_sig and cached_template_sig == template_sig:
+        return cached_wf
+    return None
+
+
+
+def _load_and_cache(path: Path) -> WorkflowDef:
+    yaml_sig = _file_signature(path)
+    wf = load_one(path)
+    template_sig = _file_signature(Path(wf.template_path)) if wf.template_path else None
+    if yaml_sig is not None:
+        with _LOAD_CACHE_LOCK:
+            _LOAD_CACHE[path] = (yaml_sig, template_sig, wf)
+    return wf
+
+
+
 def load_all(defs_dir: str | Path | None = None) -> list[WorkflowDef]:
     root = Path(defs_dir).expanduser().resolve() if defs_dir else Path(__file__).resolve().parent / "workflow_defs"
     if not root.exists():
         return []
 
+    with os.scandir(root) as entries:
+        yaml_paths = sorted(root / entry.name for entry in entries if entry.name.endswith(".yaml"))
+    cached = {path: _cached_workflow(path) for path in yaml_paths}
+    misses = [path for path, wf in cached.items() if wf is None]
+    if len(misses) > 1:
+        # Cold loads overlap file reads and libyaml parsing across threads.
+        with ThreadPoolExecutor(max_workers=min(_LOAD_WORKERS, len(misses))) as pool:
+            cached.update(zip(misses, pool.map(_load_and_cache, misses)))
+    else:
+        cached.update((path, _load_and_cache(path)) for path in misses)
+
     workflows: list[WorkflowDef] = []
     names: set[str] = set()
-    for yaml_path in sorted(root.glob("*.yaml")):
-        wf = load_one(yaml_path)
+    for yaml_path in yaml_paths:
+        wf = cached[yaml_path]
         if wf.name in names:
             raise WorkflowDefError(f"duplicate workflow name '{wf.name}' in {yaml_path}")
         names.add(wf.name)
         workflows.append(wf)
+
+    with _LOAD_CACHE_LOCK:
+        live = {cached_wf._template_prompt_json for _, _, cached_wf in _LOAD_CACHE.values()}
+        for key in [key for key in _TEMPLATE_PROMPTS if key not in live]:
+            del _TEMPLATE_PROMPTS[key]
     return workflows
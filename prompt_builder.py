@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import copy
+import os
 import random
 import struct
-import time
 from dataclasses import dataclass
 from pathlib import Path, PurePosixPath
 from typing import Any
@@ -24,66 +23,93 @@ class PromptSpec:
 
 
 
-def _coerce_param(param: ParameterDef, value: Any) -> Any:
-    if param.type == "text":
-        return "" if value is None else str(value)
-    if param.type == "bool":
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            v = value.strip().lower()
-            if v in {"1", "true", "yes", "on"}:
-                return True
-            if v in {"0", "false", "no", "off"}:
-                return False
-        raise ValueError(f"parameter '{param.name}' must be bool")
-    if param.type == "int":
-        if isinstance(value, bool):
-            raise ValueError(f"parameter '{param.name}' must be int")
-        try:
-            out = int(value)
-        except Exception as exc:
-            raise ValueError(f"parameter '{param.name}' must be int") from exc
-        if param.min is not None and out < param.min:
-            raise ValueError(f"parameter '{param.name}' below min {param.min}")
-        if param.max is not None and out > param.max:
-            raise ValueError(f"parameter '{param.name}' above max {param.max}")
-        return out
-    if param.type == "float":
-        try:
-            out = float(value)
-        except Exception as exc:
-            raise ValueError(f"parameter '{param.name}' must be float") from exc
-        if param.min is not None and out < param.min:
-            raise ValueError(f"parameter '{param.name}' below min {param.min}")
-        if param.max is not None and out > param.max:
-            raise ValueError(f"parameter '{param.name}' above max {param.max}")
-        return out
-    raise ValueError(f"unsupported parameter type: {param.type}")
+# (per-node targets, preferred field, candidate fields) for one binding or parameter.
+_Write = tuple[tuple[tuple[str, str | None], ...], str | None, list[str] | None]
+
+
+@dataclass(frozen=True, slots=True)
+class _BuildPlan:
+    input_writes: tuple[_Write, ...]
+    param_writes: tuple[tuple[str, bool, _Write], ...]
+    lora_slots: tuple[tuple[str, str, str, tuple[_Write, ...]], ...]
+    attempt_node_ids: tuple[str, ...]
+    output_prefix_write: _Write | None
+
+
+
+def _extra_lora_key_base(slot_idx: int) -> str:
+    return "extra_lora" if slot_idx == 1 else f"extra_lora{slot_idx}"
+
+
+
+def _build_plan(workflow_def: WorkflowDef) -> _BuildPlan:
+    # Everything build_prompts derives from the definition alone, computed on first use.
+    plan = workflow_def._build_plan
+    if plan is not None:
+        return plan
+
+    def write(targets: dict[str, tuple[tuple[str, str | None], ...]], name: str, binding: Any) -> _Write:
+        return targets[name], binding.field, binding.fields
+
+    bindings = workflow_def.file_bindings
+    params = workflow_def.parameters
+    input_writes = tuple(
+        write(workflow_def._binding_targets, name, bindings[name])
+        for name in ("load_image", "load_video", "input_file")
+        if name in bindings
+    )
+    # Some LoRA loader nodes validate lora_name against a non-empty list even when
+    # strength is 0. Keep template defaults when extra lora name is left blank.
+    param_writes = tuple(
+        (pname, pname.startswith("extra_lora") and pname.endswith("_name"), write(workflow_def._param_targets, pname, pdef))
+        for pname, pdef in params.items()
+        if pdef.nodes
+    )
+    lora_slots = []
+    for idx in (1, 2, 3):
+        key_base = _extra_lora_key_base(idx)
+        strength_keys = (
+            f"{key_base}_strength_high",
+            f"{key_base}_strength_low",
+            f"{key_base}_strength",  # backward compatibility
+        )
+        strength_writes = tuple(
+            write(workflow_def._param_targets, key, params[key]) for key in strength_keys if key in params and params[key].nodes
+        )
+        lora_slots.append((f"{key_base}_enabled", f"{key_base}_high_name", f"{key_base}_low_name", strength_writes))
+    attempt_node_ids = tuple(
+        dict.fromkeys(nid for name in ("output_prefix", "seed") if name in bindings for nid in bindings[name].nodes)
+    )
+
+    plan = _BuildPlan(
+        input_writes=input_writes,
+        param_writes=param_writes,
+        lora_slots=tuple(lora_slots),
+        attempt_node_ids=attempt_node_ids,
+        output_prefix_write=(
+            write(workflow_def._binding_targets, "output_prefix", bindings["output_prefix"]) if "output_prefix" in bindings else None
+        ),
+    )
+    object.__setattr__(workflow_def, "_build_plan", plan)
+    return plan
 
 
 
 def resolve_params(workflow_def: WorkflowDef, params: dict[str, Any] | None) -> dict[str, Any]:
     params = params or {}
 
-    unknown = sorted(set(params.keys()) - set(workflow_def.parameters.keys()))
+    pdefs = workflow_def.parameters
+    unknown = [k for k in params if k not in pdefs]
     if unknown:
+        unknown.sort()
         raise ValueError(f"unknown parameters for {workflow_def.name}: {', '.join(unknown)}")
 
-    resolved: dict[str, Any] = {}
-    for name, param in workflow_def.parameters.items():
-        raw = params[name] if name in params else param.default
-        resolved[name] = _coerce_param(param, raw)
-
-    return resolved
+    return {name: param._coercer(params[name] if name in params else param.default) for name, param in pdefs.items()}
 
 
 
 def _set_candidate_field(node_inputs: dict[str, Any], preferred: str | None, candidates: list[str] | None, value: Any) -> bool:
     if preferred:
-        if preferred in node_inputs:
-            node_inputs[preferred] = value
-            return True
         node_inputs[preferred] = value
         return True
 
@@ -99,51 +125,83 @@ def _set_candidate_field(node_inputs: dict[str, Any], preferred: str | None, can
 
 
 
-def _normalize_context_schedule_values(prompt: dict[str, Any]) -> None:
-    for node in prompt.values():
-        if not isinstance(node, dict):
-            continue
-        if node.get("class_type") != "WanContextWindowsManual":
-            continue
+def _write_targets(
+    prompt: dict[str, Any],
+    targets: tuple[tuple[str, str | None], ...],
+    preferred: str | None,
+    candidates: list[str] | None,
+    value: Any,
+) -> None:
+    for nid, target in targets:
+        inputs = prompt[nid]["inputs"]
+        if target is not None:
+            inputs[target] = value
+        else:
+            _set_candidate_field(inputs, preferred, candidates, value)
+
+
+
+def _owned_inputs(prompt: dict[str, Any], workflow_def: WorkflowDef, nid: str) -> dict[str, Any] | None:
+    # For nodes outside the clone overlay: copy the shared template node before writing to it.
+    node = prompt.get(nid)
+    if not isinstance(node, dict):
+        return None
+    if node is workflow_def.template_prompt.get(nid):
+        node = prompt[nid] = dict(node)
         inputs = node.get("inputs")
-        if not isinstance(inputs, dict):
-            continue
+        if isinstance(inputs, dict):
+            node["inputs"] = dict(inputs)
+    return node.setdefault("inputs", {})
+
+
+
+def _clone_attempt_prompt(file_prompt: dict[str, Any], node_ids: tuple[str, ...]) -> dict[str, Any]:
+    prompt = dict(file_prompt)
+    for nid in node_ids:
+        node = prompt[nid] = dict(prompt[nid])
+        node["inputs"] = dict(node["inputs"])
+    return prompt
+
+
+
+def _apply_node_fixups(
+    prompt: dict[str, Any],
+    workflow_def: WorkflowDef,
+    resolution: tuple[int, int] | None,
+    flip: bool,
+) -> None:
+    for nid in workflow_def._context_window_node_ids:
+        inputs = prompt[nid]["inputs"]
         value = inputs.get("context_schedule")
         if isinstance(value, str) and value in _CONTEXT_SCHEDULE_MAP:
             inputs["context_schedule"] = _CONTEXT_SCHEDULE_MAP[value]
 
+    if resolution is None and not flip:
+        return
 
-def _flip_orientation(prompt: dict[str, Any]) -> None:
-    for node in prompt.values():
-        if not isinstance(node, dict):
-            continue
-        inputs = node.get("inputs")
-        if not isinstance(inputs, dict):
-            continue
+    for nid in workflow_def._resolution_node_ids:
+        inputs = prompt[nid]["inputs"]
+        if resolution is not None:
+            width, height = int(resolution[0]), int(resolution[1])
+        else:
+            width, height = inputs["width"], inputs["height"]
+        if flip:
+            width, height = height, width
+        inputs["width"], inputs["height"] = width, height
+
+    for nid in workflow_def._dimension_node_ids:
+        inputs = prompt[nid]["inputs"]
         width = inputs.get("width")
         height = inputs.get("height")
         if isinstance(width, bool) or isinstance(height, bool):
             continue
         if not isinstance(width, (int, float)) or not isinstance(height, (int, float)):
             continue
-        inputs["width"], inputs["height"] = height, width
-
-
-def _apply_resolution(prompt: dict[str, Any], width: int, height: int) -> None:
-    for node in prompt.values():
-        if not isinstance(node, dict):
-            continue
-        inputs = node.get("inputs")
-        if not isinstance(inputs, dict):
-            continue
-        current_w = inputs.get("width")
-        current_h = inputs.get("height")
-        if isinstance(current_w, bool) or isinstance(current_h, bool):
-            continue
-        if not isinstance(current_w, (int, float)) or not isinstance(current_h, (int, float)):
-            continue
-        inputs["width"] = int(width)
-        inputs["height"] = int(height)
+        if resolution is not None:
+            width, height = int(resolution[0]), int(resolution[1])
+        if flip:
+            width, height = height, width
+        inputs["width"], inputs["height"] = width, height
 
 
 def _read_png_size(path: Path) -> tuple[int, int] | None:
@@ -326,24 +384,36 @@ def _apply_scale_multiple_dimensions(
         pdef = workflow_def.parameters.get(pname)
         if not pdef or not pdef.nodes:
             continue
-        for nid in pdef.nodes:
-            node = prompt.get(nid)
-            if not isinstance(node, dict):
-                continue
-            inputs = node.setdefault("inputs", {})
-            _set_candidate_field(inputs, pdef.field, pdef.fields, value)
+        _write_targets(prompt, workflow_def._param_targets[pname], pdef.field, pdef.fields, value)
 
 
 
-def _resolve_for_comfy_input(file_path: Path, comfy_input_dir: Path | None) -> str:
-    if comfy_input_dir is None:
-        return str(file_path)
+def _resolve_path(raw: str, memo: dict[str, Path]) -> Path:
+    # Memo lives for one build: repeated inputs skip resolve()'s lstat walk, but symlink or
+    # directory changes are always seen by the next build.
+    resolved = memo.get(raw)
+    if resolved is None:
+        resolved = memo[raw] = Path(raw).expanduser().resolve()
+    return resolved
+
+
+
+def _comfy_input_prefix(comfy_input_dir: Path) -> str:
+    prefix = str(comfy_input_dir)
+    return prefix if prefix.endswith(os.sep) else prefix + os.sep
+
 
-    try:
-        rel = file_path.resolve().relative_to(comfy_input_dir.resolve())
-        return rel.as_posix()
-    except ValueError:
-        return str(file_path)
+
+def _resolve_for_comfy_input(file_path: Path, comfy_input_prefix: str | None) -> str:
+    # Both paths are already resolved by build_prompts, so a string prefix test replaces relative_to().
+    raw = str(file_path)
+    if comfy_input_prefix is None:
+        return raw
+    if raw.startswith(comfy_input_prefix):
+        return raw[len(comfy_input_prefix) :].replace(os.sep, "/")
+    if raw == comfy_input_prefix[:-1]:
+        return "."
+    return raw
 
 
 
@@ -355,12 +425,9 @@ def _set_seed(prompt: dict[str, Any], workflow_def: WorkflowDef, randomize: bool
     if not binding:
         return None
 
-    seed = int((time.time_ns() ^ random.getrandbits(31)) % (2**63 - 1))
+    seed = random.getrandbits(63)
     for nid in binding.nodes:
-        node = prompt.get(nid)
-        if not isinstance(node, dict):
-            continue
-        inputs = node.setdefault("inputs", {})
+        inputs = prompt[nid]["inputs"]
         if binding.fields:
             for f in binding.fields:
                 if f in inputs:
@@ -443,122 +510,78 @@ def _apply_custom_prompt_composition(prompt: dict[str, Any], workflow_def: Workf
 
     positive, negative = _compose_qwen_upscale_prompts(resolved_params)
     for node_id, text in (("10", positive), ("11", negative)):
-        node = prompt.get(node_id)
-        if not isinstance(node, dict):
-            continue
-        inputs = node.setdefault("inputs", {})
-        inputs["prompt"] = text
+        inputs = _owned_inputs(prompt, workflow_def, node_id)
+        if inputs is not None:
+            inputs["prompt"] = text
 
 
-def _set_output_prefix(prompt: dict[str, Any], workflow_def: WorkflowDef, output_prefix: str, stem: str) -> str:
-    binding = workflow_def.file_bindings.get("output_prefix")
-    if not binding:
+def _set_output_prefix(prompt: dict[str, Any], plan: _BuildPlan, output_prefix_head: str, stem: str) -> str:
+    if plan.output_prefix_write is None:
         return stem
 
-    base = _normalize_output_prefix(output_prefix)
-    final = f"{base}/{stem}" if base else stem
-    for nid in binding.nodes:
-        node = prompt.get(nid)
-        if not isinstance(node, dict):
-            continue
-        inputs = node.setdefault("inputs", {})
-        _set_candidate_field(inputs, binding.field, binding.fields, final)
+    final = output_prefix_head + stem
+    targets, preferred, candidates = plan.output_prefix_write
+    _write_targets(prompt, targets, preferred, candidates, final)
     return final
 
 
 
-def _apply_input_binding(prompt: dict[str, Any], workflow_def: WorkflowDef, relative_input_path: str) -> None:
-    for binding_name in ("load_image", "load_video", "input_file"):
-        binding = workflow_def.file_bindings.get(binding_name)
-        if not binding:
-            continue
-        for nid in binding.nodes:
-            node = prompt.get(nid)
-            if not isinstance(node, dict):
-                continue
-            inputs = node.setdefault("inputs", {})
-            _set_candidate_field(inputs, binding.field, binding.fields, relative_input_path)
+def _apply_input_binding(prompt: dict[str, Any], plan: _BuildPlan, relative_input_path: str) -> None:
+    for targets, preferred, candidates in plan.input_writes:
+        _write_targets(prompt, targets, preferred, candidates, relative_input_path)
 
 
 
 def _apply_switch_states(prompt: dict[str, Any], workflow_def: WorkflowDef) -> None:
     for switch in workflow_def.switch_states:
-        node = prompt.get(switch.node_id)
-        if not isinstance(node, dict):
-            continue
-        inputs = node.setdefault("inputs", {})
-        inputs[switch.field] = switch.value
+        prompt[switch.node_id]["inputs"][switch.field] = switch.value
 
 
 
-def _apply_param_overrides(prompt: dict[str, Any], workflow_def: WorkflowDef, resolved_params: dict[str, Any]) -> None:
-    for pname, pdef in workflow_def.parameters.items():
-        if not pdef.nodes:
-            continue
+def _extra_slot_active(resolved_params: dict[str, Any], slot: tuple[str, str, str, tuple[_Write, ...]]) -> bool:
+    enabled_key, high_key, low_key, _ = slot
+    enabled = bool(resolved_params.get(enabled_key, False))
+    if not enabled:
+        return False
+    high = str(resolved_params.get(high_key, "") or "").strip()
+    low = str(resolved_params.get(low_key, "") or "").strip()
+    # Slot is active only when both high/low names are explicitly provided.
+    return bool(high and low)
+
+
+
+def _apply_param_overrides(
+    prompt: dict[str, Any],
+    workflow_def: WorkflowDef,
+    plan: _BuildPlan,
+    resolved_params: dict[str, Any],
+) -> None:
+    for pname, keep_blank_template, (targets, preferred, candidates) in plan.param_writes:
         value = resolved_params[pname]
-        # Some LoRA loader nodes validate lora_name against a non-empty list even when
-        # strength is 0. Keep template defaults when extra lora name is left blank.
-        if (
-            isinstance(value, str)
-            and value.strip() == ""
-            and pname.startswith("extra_lora")
-            and pname.endswith("_name")
-        ):
+        if keep_blank_template and isinstance(value, str) and value.strip() == "":
             continue
-        for nid in pdef.nodes:
-            node = prompt.get(nid)
-            if not isinstance(node, dict):
-                continue
-            inputs = node.setdefault("inputs", {})
-            _set_candidate_field(inputs, pdef.field, pdef.fields, value)
+        _write_targets(prompt, targets, preferred, candidates, value)
 
     _apply_custom_prompt_composition(prompt, workflow_def, resolved_params)
 
-    def _extra_slot_active(slot_idx: int) -> bool:
-        key_base = "extra_lora" if slot_idx == 1 else f"extra_lora{slot_idx}"
-        enabled = bool(resolved_params.get(f"{key_base}_enabled", False))
-        if not enabled:
-            return False
-        high = str(resolved_params.get(f"{key_base}_high_name", "") or "").strip()
-        low = str(resolved_params.get(f"{key_base}_low_name", "") or "").strip()
-        # Slot is active only when both high/low names are explicitly provided.
-        return bool(high and low)
-
     # Explicit enable + name requirements for extra LoRA slots take precedence over strength values.
     # If inactive, force slot strength to 0 so users do not have to rely on manual zeroing.
-    for idx in (1, 2, 3):
-        key_base = "extra_lora" if idx == 1 else f"extra_lora{idx}"
-        active = _extra_slot_active(idx)
-        if active:
+    for slot in plan.lora_slots:
+        if _extra_slot_active(resolved_params, slot):
             continue
-        strength_keys = [
-            f"{key_base}_strength_high",
-            f"{key_base}_strength_low",
-            f"{key_base}_strength",  # backward compatibility
-        ]
-        for strength_key in strength_keys:
-            strength_def = workflow_def.parameters.get(strength_key)
-            if not strength_def or not strength_def.nodes:
-                continue
-            for nid in strength_def.nodes:
-                node = prompt.get(nid)
-                if not isinstance(node, dict):
-                    continue
-                inputs = node.setdefault("inputs", {})
-                _set_candidate_field(inputs, strength_def.field, strength_def.fields, 0.0)
+        for targets, preferred, candidates in slot[3]:
+            _write_targets(prompt, targets, preferred, candidates, 0.0)
 
     # For single-pass WAN workflow, bypass unused extra LoRA nodes to preserve original
     # base-model path when extras are not enabled.
     if workflow_def.name == "wan-context-lite-2stage":
-        e1 = _extra_slot_active(1)
-        e2 = _extra_slot_active(2)
+        e1 = _extra_slot_active(resolved_params, plan.lora_slots[0])
+        e2 = _extra_slot_active(resolved_params, plan.lora_slots[1])
 
         def _set_model_input(node_id: str, src_id: str) -> None:
-            node = prompt.get(node_id)
-            if not isinstance(node, dict):
-                return
-            inputs = node.setdefault("inputs", {})
-            inputs["model"] = [src_id, 0]
+            inputs = _owned_inputs(prompt, workflow_def, node_id)
+            if inputs is not None:
+                inputs["model"] = [src_id, 0]
 
         # Slot 1 always chains from base 4-step LoRA nodes.
         _set_model_input("201", "101")
@@ -595,10 +618,13 @@ def build_prompts(
     flip_orientation: bool = False,
 ) -> list[PromptSpec]:
     raw_params = dict(params or {})
-    comfy_input = Path(comfy_input_dir).expanduser().resolve() if comfy_input_dir else None
+    resolved_paths: dict[str, Path] = {}
+    comfy_input_prefix = (
+        _comfy_input_prefix(_resolve_path(str(comfy_input_dir), resolved_paths)) if comfy_input_dir else None
+    )
     paths: list[Path | None]
     if input_files:
-        paths = [Path(p).expanduser().resolve() for p in input_files]
+        paths = [_resolve_path(str(p), resolved_paths) for p in input_files]
     else:
         # Input-less workflows (e.g. T2I) still need one prompt per try.
         paths = [None]
@@ -608,11 +634,15 @@ def build_prompts(
     tries = int(resolved.get("tries", 1))
     randomize = bool(resolved.get("randomize_seed", False) or tries > 1)
     flip = bool(flip_orientation or resolved.get("flip_orientation", False))
-    output_prefix_base = str(resolved.get("output_prefix", ""))
+    output_prefix_base = _normalize_output_prefix(str(resolved.get("output_prefix", "")))
+    output_prefix_head = f"{output_prefix_base}/" if output_prefix_base else ""
+    attempt_suffixes = [""] if tries == 1 else [f"_try{attempt:02d}" for attempt in range(1, tries + 1)]
+
+    plan = _build_plan(workflow_def)
 
     specs: list[PromptSpec] = []
     for file_path in paths:
-        rel_input = _resolve_for_comfy_input(file_path, comfy_input) if file_path is not None else None
+        rel_input = _resolve_for_comfy_input(file_path, comfy_input_prefix) if file_path is not None else None
         effective = resolved
         if file_path is not None:
             override_raw = per_file_params.get(str(file_path))
@@ -622,25 +652,21 @@ def build_prompts(
                 merged = dict(resolved)
                 merged.update(dict(override_raw))
                 effective = resolve_params(workflow_def, merged)
-        for attempt in range(1, tries + 1):
-            prompt = copy.deepcopy(workflow_def.template_prompt)
-            if rel_input is not None:
-                _apply_input_binding(prompt, workflow_def, rel_input)
-            _apply_param_overrides(prompt, workflow_def, effective)
-            _apply_scale_multiple_dimensions(prompt, workflow_def, file_path, effective, raw_params)
-            _apply_switch_states(prompt, workflow_def)
-            _normalize_context_schedule_values(prompt)
-            if resolution is not None:
-                _apply_resolution(prompt, int(resolution[0]), int(resolution[1]))
-            if flip:
-                _flip_orientation(prompt)
-
-            if file_path is None:
-                stem_base = "prompt"
-            else:
-                stem_base = file_path.stem
-            stem = stem_base if tries == 1 else f"{stem_base}_try{attempt:02d}"
-            out_prefix = _set_output_prefix(prompt, workflow_def, output_prefix_base, stem)
+
+        # Everything except the output prefix and seed is the same for every attempt of a file,
+        # so build it once and give each attempt a shallow overlay of it.
+        file_prompt = workflow_def.clone_template_prompt()
+        if rel_input is not None:
+            _apply_input_binding(file_prompt, plan, rel_input)
+        _apply_param_overrides(file_prompt, workflow_def, plan, effective)
+        _apply_scale_multiple_dimensions(file_prompt, workflow_def, file_path, effective, raw_params)
+        _apply_switch_states(file_prompt, workflow_def)
+        _apply_node_fixups(file_prompt, workflow_def, resolution, flip)
+
+        stem_base = "prompt" if file_path is None else file_path.stem
+        for attempt, suffix in enumerate(attempt_suffixes, start=1):
+            prompt = file_prompt if attempt == tries else _clone_attempt_prompt(file_prompt, plan.attempt_node_ids)
+            out_prefix = _set_output_prefix(prompt, plan, output_prefix_head, stem_base + suffix)
             seed_used = _set_seed(prompt, workflow_def, randomize)
 
             specs.append(
@@ -4,6 +4,7 @@ import re
 import shutil
 import subprocess
 import time
+from dataclasses import replace
 from pathlib import Path
 from typing import Any
 
@@ -12,6 +13,9 @@ from defs import WorkflowDef
 from prompt_builder import PromptSpec, build_prompts, resolve_params
 
 WINDOWS_DRIVE_RE = re.compile(r"^[A-Za-z]:[\\/]")
+_STAGE_STEM_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+_STAGE_SUFFIX_RE = re.compile(r"\.[A-Za-z0-9]+")
+_STAGE_SUFFIX_UNSAFE_RE = re.compile(r"[^A-Za-z0-9]+")
 
 
 def _run_capture(cmd: list[str], timeout: int = 300) -> str | None:
@@ -105,11 +109,11 @@ def validate_single_input_file(workflow: WorkflowDef, input_path: str, field_lab
 
 
 def sanitize_stage_filename(name: str) -> str:
-    base = Path(name or "").name
-    stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", Path(base).stem).strip("._") or "input"
-    suffix = Path(base).suffix
-    if suffix and not re.fullmatch(r"\.[A-Za-z0-9]+", suffix):
-        suffix = re.sub(r"[^A-Za-z0-9]+", "", suffix)
+    base = Path(Path(name or "").name)
+    stem = _STAGE_STEM_UNSAFE_RE.sub("_", base.stem).strip("._") or "input"
+    suffix = base.suffix
+    if suffix and not _STAGE_SUFFIX_RE.fullmatch(suffix):
+        suffix = _STAGE_SUFFIX_UNSAFE_RE.sub("", suffix)
         suffix = f".{suffix}" if suffix else ""
     return f"{stem}{suffix.lower()}"
 
@@ -240,19 +244,14 @@ def prepare_prompt_specs(
         flip_orientation=bool(flip_orientation),
     )
 
-    specs: list[PromptSpec] = []
-    for spec in built_specs:
-        built_key = str(Path(spec.input_file).expanduser().resolve()) if spec.input_file else spec.input_file
-        source_input = source_by_built.get(built_key, spec.input_file)
-        specs.append(
-            PromptSpec(
-                input_file=source_input,
-                prompt_json=spec.prompt_json,
-                seed_used=spec.seed_used,
-                output_prefix=spec.output_prefix,
-            )
-        )
-    return resolved, specs
+    # build_prompts reports already-resolved input paths, so staged paths map straight back to
+    # their sources. Specs are swapped in place rather than copied into a second list.
+    if source_by_built:
+        for idx, spec in enumerate(built_specs):
+            source_input = source_by_built.get(spec.input_file)
+            if source_input is not None:
+                built_specs[idx] = replace(spec, input_file=source_input)
+    return resolved, built_specs
 
 
 def enqueue_job(
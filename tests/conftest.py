@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import http.client
 import json
 import os
 import shutil
@@ -8,13 +9,12 @@ import subprocess
 import tempfile
 import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import pytest
 
@@ -23,6 +23,23 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 VENV_PYTHON = PROJECT_ROOT / "venv" / "bin" / "python"
 
 
+_TERMINAL_JOB_STATUSES = frozenset({"succeeded", "failed", "canceled"})
+STUB_PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def _write_stub_pngs(directory: Path, *names: str) -> list[Path]:
+    paths = []
+    for name in names:
+        path = directory / name
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, STUB_PNG)
+        finally:
+            os.close(fd)
+        paths.append(path)
+    return paths
+
+
 def _find_free_port() -> int:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind(("127.0.0.1", 0))
@@ -39,11 +56,13 @@ class _FakeComfyHandler(BaseHTTPRequestHandler):
         length = int(self.headers.get("Content-Length", "0") or "0")
         if length <= 0:
             return {}
-        raw = self.rfile.read(length).decode("utf-8")
+        raw = self.rfile.read(length)
         return json.loads(raw) if raw else {}
 
     def _send_json(self, payload: Any, status: int = 200) -> None:
-        body = json.dumps(payload).encode("utf-8")
+        self._send_body(json.dumps(payload).encode("utf-8"), status)
+
+    def _send_body(self, body: bytes, status: int = 200) -> None:
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
@@ -69,24 +88,26 @@ class _FakeComfyHandler(BaseHTTPRequestHandler):
             hist["polls"] += 1
             complete_after = int(hist.get("complete_after", self.state["complete_after"]))
             completed = hist["polls"] >= complete_after
-            status_str = "success" if completed else "running"
-            payload: dict[str, Any] = {
-                prompt_id: {
-                    "status": {"completed": completed, "status_str": status_str},
+            # Poll responses only change once, so encode each state a single time per prompt.
+            body_key = "completed_body" if completed else "running_body"
+            body = hist.get(body_key)
+            if body is None:
+                entry: dict[str, Any] = {
+                    "status": {"completed": completed, "status_str": "success" if completed else "running"},
                 }
-            }
-            if completed:
-                payload[prompt_id]["outputs"] = {
-                    "108": {
-                        "videos": [
-                            {
-                                "filename": f"{prompt_id}.mp4",
-                                "subfolder": "video/test",
-                            }
-                        ]
+                if completed:
+                    entry["outputs"] = {
+                        "108": {
+                            "videos": [
+                                {
+                                    "filename": f"{prompt_id}.mp4",
+                                    "subfolder": "video/test",
+                                }
+                            ]
+                        }
                     }
-                }
-            self._send_json(payload)
+                body = hist[body_key] = json.dumps({prompt_id: entry}).encode("utf-8")
+            self._send_body(body)
             return
 
         self._send_json({"error": "not found"}, status=404)
@@ -131,27 +152,39 @@ class QueueServer:
     proc: subprocess.Popen[bytes]
     fake_comfy: FakeComfyServer
 
+    _conn: http.client.HTTPConnection | None = field(default=None, init=False, repr=False)
+
+    def _send(self, method: str, path: str, body: bytes | None, headers: dict[str, str]) -> tuple[int, bytes]:
+        # One keep-alive connection to uvicorn instead of a new TCP connection per wait_until poll.
+        while True:
+            reused = self._conn is not None
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(urllib.parse.urlsplit(self.base_url).netloc, timeout=20)
+            try:
+                self._conn.request(method, path, body=body, headers=headers)
+                resp = self._conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, OSError):
+                self._conn.close()
+                self._conn = None
+                if not reused:
+                    raise
+
     def request(self, method: str, path: str, payload: dict[str, Any] | None = None, expected: int = 200) -> Any:
         body = None
         headers = {}
         if payload is not None:
             body = json.dumps(payload).encode("utf-8")
             headers["Content-Type"] = "application/json"
-        req = urllib.request.Request(f"{self.base_url}{path}", data=body, headers=headers, method=method)
+        status, raw = self._send(method, path, body, headers)
+        if status != expected:
+            raise AssertionError(f"expected HTTP {expected}, got {status}: {raw.decode('utf-8', errors='replace')}")
+        if status < 400:
+            return json.loads(raw) if raw else {}
         try:
-            with urllib.request.urlopen(req, timeout=20) as resp:
-                txt = resp.read().decode("utf-8")
-                if resp.status != expected:
-                    raise AssertionError(f"expected HTTP {expected}, got {resp.status}: {txt}")
-                return json.loads(txt) if txt else {}
-        except urllib.error.HTTPError as exc:
-            txt = exc.read().decode("utf-8", errors="replace")
-            if exc.code != expected:
-                raise AssertionError(f"expected HTTP {expected}, got {exc.code}: {txt}") from exc
-            try:
-                return json.loads(txt)
-            except json.JSONDecodeError:
-                return {"detail": txt}
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return {"detail": raw.decode("utf-8", errors="replace")}
 
     def wait_until(self, predicate, timeout: float = 15.0, step: float = 0.1) -> Any:
         end = time.time() + timeout
@@ -163,7 +196,30 @@ class QueueServer:
             time.sleep(step)
         raise AssertionError("timed out waiting for predicate")
 
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        self.request("POST", "/api/queue/pause")
+        try:
+            yield
+        finally:
+            self.request("POST", "/api/queue/resume")
+
+    def wait_for_terminal(self, job_id: int, timeout: float = 15.0) -> dict[str, Any]:
+        # Polls fast right after submit and backs off, instead of a fixed step per test.
+        end = time.time() + timeout
+        step = 0.02
+        while True:
+            detail = self.request("GET", f"/api/jobs/{job_id}")
+            if detail["job"]["status"] in _TERMINAL_JOB_STATUSES:
+                return detail
+            if time.time() >= end:
+                raise AssertionError(f"timed out waiting for job {job_id} to finish: {detail['job']['status']}")
+            time.sleep(step)
+            step = min(step * 2, 0.25)
+
     def stop(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
         self.proc.terminate()
         try:
             self.proc.wait(timeout=8)
@@ -195,8 +251,7 @@ def _start_queue_server(workflow_defs_dir: Path) -> tuple[QueueServer, Path]:
     (comfy_root / "input").mkdir(parents=True, exist_ok=True)
     (comfy_root / "models" / "loras").mkdir(parents=True, exist_ok=True)
 
-    sample_image = comfy_root / "input" / "sample.png"
-    sample_image.write_bytes(b"\x89PNG\r\n\x1a\n")
+    [sample_image] = _write_stub_pngs(comfy_root / "input", "sample.png")
 
     port = _find_free_port()
     env = os.environ.copy()
@@ -230,6 +285,19 @@ def _start_queue_server(workflow_defs_dir: Path) -> tuple[QueueServer, Path]:
     return server, temp_dir
 
 
+@pytest.fixture
+def stub_pngs():
+    # Header-only PNG files: enough for extension checks, staging and prompt building.
+    return _write_stub_pngs
+
+
+@pytest.fixture(scope="session")
+def sample_png(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # Read-only input shared by tests that only need one image to build prompts from.
+    [path] = _write_stub_pngs(tmp_path_factory.mktemp("imgs"), "sample.png")
+    return path
+
+
 @pytest.fixture(scope="session")
 def queue_server() -> QueueServer:
     server, temp_dir = _start_queue_server(PROJECT_ROOT / "workflow_defs_v2")
@@ -249,6 +317,20 @@ def queue_server() -> QueueServer:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+@pytest.fixture
+def paused_queue(queue_server: QueueServer):
+    # The session server is shared; always hand it back running, empty and with default Comfy timing.
+    # Leftover jobs are cleared before resuming so the woken worker never starts on them.
+    try:
+        with queue_server.paused():
+            try:
+                yield
+            finally:
+                queue_server.request("POST", "/api/queue/clear")
+    finally:
+        queue_server.fake_comfy.set_complete_after(50)
+
+
 @pytest.fixture
 def queue_server_factory():
     created: list[tuple[QueueServer, Path]] = []
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import shutil
 from pathlib import Path
 
 
@@ -69,15 +70,7 @@ parameters:
     )
     assert int(job["prompt_count"]) == 1
 
-    terminal = server.wait_until(
-        lambda: (
-            (detail := server.request("GET", f"/api/jobs/{job['job_id']}"))
-            and detail["job"]["status"] in {"succeeded", "failed", "canceled"}
-            and detail
-        ),
-        timeout=10,
-        step=0.2,
-    )
+    terminal = server.wait_for_terminal(job["job_id"], timeout=10)
     assert terminal["job"]["status"] == "succeeded"
     assert len(terminal["prompts"]) == 1
     prompt = terminal["prompts"][0]
@@ -94,7 +87,7 @@ def test_image_gen_i2i_submit_succeeds_and_completed_detail_has_outputs(queue_se
     image_dir = tmp_path / "image_gen_i2i"
     image_dir.mkdir(parents=True, exist_ok=True)
     source = image_dir / "source.png"
-    source.write_bytes(queue_server.sample_image.read_bytes())
+    shutil.copyfile(queue_server.sample_image, source)
 
     job = queue_server.request(
         "POST",
@@ -115,15 +108,7 @@ def test_image_gen_i2i_submit_succeeds_and_completed_detail_has_outputs(queue_se
     )
     assert int(job["prompt_count"]) == 1
 
-    terminal = queue_server.wait_until(
-        lambda: (
-            (detail := queue_server.request("GET", f"/api/jobs/{job['job_id']}"))
-            and detail["job"]["status"] in {"succeeded", "failed", "canceled"}
-            and detail
-        ),
-        timeout=10,
-        step=0.2,
-    )
+    terminal = queue_server.wait_for_terminal(job["job_id"], timeout=10)
     assert terminal["job"]["status"] == "succeeded"
     assert len(terminal["prompts"]) == 1
     prompt = terminal["prompts"][0]
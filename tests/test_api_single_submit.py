@@ -2,21 +2,21 @@ from __future__ import annotations
 
 import json
 import re
+import shutil
 from pathlib import Path
 
+import pytest
+
+_STAGE_BATCH_RE = re.compile(r"(_video_queue_staging/)[^/\"]+/")
+
 
 def _json_obj(value):
     return json.loads(value) if isinstance(value, str) else value
 
 
-def _normalize_stage_batch_token(value):
-    if isinstance(value, dict):
-        return {k: _normalize_stage_batch_token(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [_normalize_stage_batch_token(v) for v in value]
-    if isinstance(value, str):
-        return re.sub(r"(_video_queue_staging/)[^/]+/", r"\1<BATCH>/", value)
-    return value
+def _normalize_stage_batch_token(value) -> str:
+    # Staging dirs carry a per-submit batch token; compare payloads with it masked out.
+    return _STAGE_BATCH_RE.sub(r"\1<BATCH>/", json.dumps(value, sort_keys=True))
 
 
 def _collect_stage_refs(value, out: list[str]) -> None:
@@ -32,8 +32,8 @@ def _collect_stage_refs(value, out: list[str]) -> None:
         out.append(value)
 
 
+@pytest.mark.usefixtures("paused_queue")
 def test_single_submit_success_and_fanout(queue_server):
-    queue_server.request("POST", "/api/queue/pause")
     job = queue_server.request(
         "POST",
         "/api/jobs/single",
@@ -53,8 +53,6 @@ def test_single_submit_success_and_fanout(queue_server):
     for prompt in detail["prompts"]:
         assert prompt["input_file"] == str(queue_server.sample_image)
 
-    queue_server.request("POST", "/api/queue/resume")
-
 
 def test_single_submit_missing_image_is_rejected(queue_server):
     err = queue_server.request(
@@ -86,13 +84,12 @@ def test_single_submit_invalid_extension_is_rejected(queue_server, tmp_path):
     assert "unsupported input image extension" in str(err.get("detail", "")).lower()
 
 
+@pytest.mark.usefixtures("paused_queue")
 def test_batch_and_single_shared_options_produce_equivalent_prompt_payload(queue_server, tmp_path):
-    queue_server.request("POST", "/api/queue/pause")
-
     batch_dir = tmp_path / "batch"
     batch_dir.mkdir(parents=True, exist_ok=True)
     sample_copy = batch_dir / "sample.png"
-    sample_copy.write_bytes(queue_server.sample_image.read_bytes())
+    shutil.copyfile(queue_server.sample_image, sample_copy)
 
     common_params = {
         "positive_prompt": "(at 0 second: one)(at 3 second: two)(at 7 second: three)",
@@ -134,146 +131,126 @@ def test_batch_and_single_shared_options_produce_equivalent_prompt_payload(queue
     single_prompt = _normalize_stage_batch_token(_json_obj(single_detail["prompts"][0]["prompt_json"]))
     assert batch_prompt == single_prompt
 
-    queue_server.request("POST", "/api/queue/resume")
-
 
+@pytest.mark.usefixtures("paused_queue")
 def test_single_submit_stages_prompt_input_and_preserves_original_input_file(queue_server, tmp_path):
-    queue_server.request("POST", "/api/queue/pause")
     queue_server.fake_comfy.set_complete_after(1)
-    try:
-        source_image = tmp_path / "source_input.png"
-        source_image.write_bytes(queue_server.sample_image.read_bytes())
-        job = queue_server.request(
-            "POST",
-            "/api/jobs/single",
+    source_image = tmp_path / "source_input.png"
+    shutil.copyfile(queue_server.sample_image, source_image)
+    job = queue_server.request(
+        "POST",
+        "/api/jobs/single",
+        {
+            "workflow_name": "wan-context-lite-2stage",
+            "input_image": str(source_image),
+            "params": {"tries": 1},
+        },
+        expected=201,
+    )
+
+    detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
+    prompt = detail["prompts"][0]
+    assert prompt["input_file"] == str(source_image)
+
+    payload = _json_obj(prompt["prompt_json"])
+    encoded = json.dumps(payload)
+    assert "_video_queue_staging/" in encoded
+    assert str(source_image) not in encoded
+
+    refs: list[str] = []
+    _collect_stage_refs(payload, refs)
+    assert refs
+    first_ref = refs[0]
+    staged_path = Path(first_ref)
+    if not staged_path.is_absolute():
+        staged_path = (queue_server.comfy_root / "input" / staged_path).resolve()
+    assert staged_path.exists()
+    assert staged_path.read_bytes() == source_image.read_bytes()
+
+    source_image.unlink()
+    assert not source_image.exists()
+    assert staged_path.exists()
+    queue_server.request("POST", "/api/queue/resume")
+
+    terminal = queue_server.wait_for_terminal(job["job_id"], timeout=10)
+    assert terminal["job"]["status"] == "succeeded"
+
+
+@pytest.mark.usefixtures("paused_queue")
+@pytest.mark.parametrize(
+    ("workflow_name", "params", "expected_texts"),
+    [
+        pytest.param(
+            "wan-context-2stage-split-prompts",
             {
-                "workflow_name": "wan-context-lite-2stage",
-                "input_image": str(source_image),
-                "params": {"tries": 1},
+                "positive_prompt_stage1": "standing still, subtle motion",
+                "positive_prompt_stage2": "continues turn, settles into pose",
+                "negative_prompt": "jitter, artifacts",
             },
-            expected=201,
-        )
-
-        detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
-        prompt = detail["prompts"][0]
-        assert prompt["input_file"] == str(source_image)
-
-        payload = _json_obj(prompt["prompt_json"])
-        encoded = json.dumps(payload, sort_keys=True)
-        assert "_video_queue_staging/" in encoded
-        assert str(source_image) not in encoded
-
-        refs: list[str] = []
-        _collect_stage_refs(payload, refs)
-        assert refs
-        first_ref = refs[0]
-        staged_path = Path(first_ref)
-        if not staged_path.is_absolute():
-            staged_path = (queue_server.comfy_root / "input" / staged_path).resolve()
-        assert staged_path.exists()
-        assert staged_path.read_bytes() == source_image.read_bytes()
-
-        source_image.unlink()
-        assert not source_image.exists()
-        assert staged_path.exists()
-        queue_server.request("POST", "/api/queue/resume")
-
-        def _done():
-            d = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
-            return d if d["job"]["status"] in {"succeeded", "failed", "canceled"} else None
-
-        terminal = queue_server.wait_until(_done, timeout=10, step=0.2)
-        assert terminal["job"]["status"] == "succeeded"
-    finally:
-        queue_server.fake_comfy.set_complete_after(50)
-        queue_server.request("POST", "/api/queue/resume")
-
-
-def test_api_submit_persists_distinct_stage_prompts_for_2stage_split_workflow(queue_server):
-    queue_server.request("POST", "/api/queue/pause")
-    try:
-        job = queue_server.request(
-            "POST",
-            "/api/jobs/single",
             {
-                "workflow_name": "wan-context-2stage-split-prompts",
-                "input_image": str(queue_server.sample_image),
-                "params": {
-                    "positive_prompt_stage1": "standing still, subtle motion",
-                    "positive_prompt_stage2": "continues turn, settles into pose",
-                    "negative_prompt": "jitter, artifacts",
-                },
+                "93": "standing still, subtle motion",
+                "193": "continues turn, settles into pose",
+                "89": "jitter, artifacts",
             },
-            expected=201,
-        )
-        detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
-        assert len(detail["prompts"]) == 1
-
-        prompt_json = detail["prompts"][0]["prompt_json"]
-        prompt = json.loads(prompt_json) if isinstance(prompt_json, str) else prompt_json
-        assert prompt["93"]["inputs"]["text"] == "standing still, subtle motion"
-        assert prompt["193"]["inputs"]["text"] == "continues turn, settles into pose"
-        assert prompt["89"]["inputs"]["text"] == "jitter, artifacts"
-    finally:
-        queue_server.request("POST", "/api/queue/resume")
-
-
-def test_api_submit_maps_all_three_stage_prompts_for_3stage_workflow(queue_server):
-    queue_server.request("POST", "/api/queue/pause")
-    try:
-        job = queue_server.request(
-            "POST",
-            "/api/jobs/single",
+            id="2stage",
+        ),
+        pytest.param(
+            "wan-context-3stage-split-prompts",
             {
-                "workflow_name": "wan-context-3stage-split-prompts",
-                "input_image": str(queue_server.sample_image),
-                "params": {
-                    "positive_prompt_stage1": "start motion",
-                    "positive_prompt_stage2": "continue motion",
-                    "positive_prompt_stage3": "finish and hold",
-                    "negative_prompt": "stutter",
-                },
+                "positive_prompt_stage1": "start motion",
+                "positive_prompt_stage2": "continue motion",
+                "positive_prompt_stage3": "finish and hold",
+                "negative_prompt": "stutter",
             },
-            expected=201,
-        )
-        detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
-        assert len(detail["prompts"]) == 1
-
-        prompt_json = detail["prompts"][0]["prompt_json"]
-        prompt = json.loads(prompt_json) if isinstance(prompt_json, str) else prompt_json
-        assert prompt["93"]["inputs"]["text"] == "start motion"
-        assert prompt["193"]["inputs"]["text"] == "continue motion"
-        assert prompt["293"]["inputs"]["text"] == "finish and hold"
-    finally:
-        queue_server.request("POST", "/api/queue/resume")
-
-
-def test_upscale_images_mode_queues_one_prompt_per_image(queue_server, tmp_path):
-    queue_server.request("POST", "/api/queue/pause")
-    try:
-        image_dir = tmp_path / "upscale_batch"
-        image_dir.mkdir(parents=True, exist_ok=True)
-        for idx in range(3):
-            (image_dir / f"img_{idx}.png").write_bytes(b"\x89PNG\r\n\x1a\n")
-
-        job = queue_server.request(
-            "POST",
-            "/api/jobs",
             {
-                "workflow_name": "upscale-images-i2v",
-                "input_dir": str(image_dir),
-                "params": {
-                    "upscale_model_name": "RealESRGAN_x2plus.pth",
-                    "final_scale_factor": 0.75,
-                    "output_prefix": "image/upscaled_i2v",
-                },
-                "split_by_input": False,
+                "93": "start motion",
+                "193": "continue motion",
+                "293": "finish and hold",
             },
-            expected=201,
-        )
-        assert int(job["prompt_count"]) == 3
-
-        detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
-        assert len(detail["prompts"]) == 3
-    finally:
-        queue_server.request("POST", "/api/queue/resume")
+            id="3stage",
+        ),
+    ],
+)
+def test_api_submit_maps_split_stage_prompts(queue_server, workflow_name, params, expected_texts):
+    job = queue_server.request(
+        "POST",
+        "/api/jobs/single",
+        {
+            "workflow_name": workflow_name,
+            "input_image": str(queue_server.sample_image),
+            "params": params,
+        },
+        expected=201,
+    )
+    detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
+    assert len(detail["prompts"]) == 1
+
+    prompt = _json_obj(detail["prompts"][0]["prompt_json"])
+    assert {nid: prompt[nid]["inputs"]["text"] for nid in expected_texts} == expected_texts
+
+
+@pytest.mark.usefixtures("paused_queue")
+def test_upscale_images_mode_queues_one_prompt_per_image(queue_server, tmp_path, stub_pngs):
+    image_dir = tmp_path / "upscale_batch"
+    image_dir.mkdir(parents=True, exist_ok=True)
+    stub_pngs(image_dir, *[f"img_{idx}.png" for idx in range(3)])
+
+    job = queue_server.request(
+        "POST",
+        "/api/jobs",
+        {
+            "workflow_name": "upscale-images-i2v",
+            "input_dir": str(image_dir),
+            "params": {
+                "upscale_model_name": "RealESRGAN_x2plus.pth",
+                "final_scale_factor": 0.75,
+                "output_prefix": "image/upscaled_i2v",
+            },
+            "split_by_input": False,
+        },
+        expected=201,
+    )
+    assert int(job["prompt_count"]) == 3
+
+    detail = queue_server.request("GET", f"/api/jobs/{job['job_id']}")
+    assert len(detail["prompts"]) == 3
@@ -1,22 +1,22 @@
 from __future__ import annotations
 
+import contextlib
+import io
 import json
-import subprocess
 from pathlib import Path
 
-
-ROOT = Path(__file__).resolve().parents[1]
-PY = ROOT / "venv" / "bin" / "python"
+import auto_prompt_cli
 
 
 def run_cmd(args: list[str]) -> tuple[int, str, str]:
-    p = subprocess.run(
-        [str(PY), str(ROOT / "auto_prompt_cli.py"), *args],
-        cwd=str(ROOT),
-        capture_output=True,
-        text=True,
-    )
-    return p.returncode, p.stdout, p.stderr
+    # In-process: the CLI's imports are already loaded, so skip a fresh interpreter per test.
+    out, err = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            code = auto_prompt_cli.main(args)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+    return code, out.getvalue(), err.getvalue()
 
 
 def test_cli_mock_both_stage_outputs_json(tmp_path: Path):
@@ -4,6 +4,13 @@ from pathlib import Path
 
 
 ROOT = Path(__file__).resolve().parents[1]
+_APP_AUTO_PROMPT_SNIPPETS = (
+    "class AutoPromptRequest(BaseModel)",
+    "@app.post(\"/api/auto-prompt\")",
+    "@app.get(\"/api/auto-prompt/capability\")",
+    "AutoPromptGenerator",
+    "LMStudioUnavailable",
+)
 
 
 def test_auto_prompt_modules_exist():
@@ -14,8 +21,5 @@ def test_auto_prompt_modules_exist():
 
 def test_app_registers_auto_prompt_endpoints_and_models():
     app_text = (ROOT / "app.py").read_text(encoding="utf-8")
-    assert "class AutoPromptRequest(BaseModel)" in app_text
-    assert "@app.post(\"/api/auto-prompt\")" in app_text
-    assert "@app.get(\"/api/auto-prompt/capability\")" in app_text
-    assert "AutoPromptGenerator" in app_text
-    assert "LMStudioUnavailable" in app_text
+    missing = [snippet for snippet in _APP_AUTO_PROMPT_SNIPPETS if snippet not in app_text]
+    assert not missing
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 from pathlib import Path
 
 from auto_prompt.generator import AutoPromptGenerator, LMStudioUnavailable
@@ -7,6 +8,12 @@ from defs import load_all
 
 
 ROOT = Path(__file__).resolve().parents[1]
+# (stage, split_prompt_workflow) -> canned LM Studio reply.
+_FAKE_RESPONSES = {
+    ("caption", False): "caption for image",
+    ("motion", False): "single motion prompt",
+    ("motion", True): '{"clip_1":"clip1 move", "clip_2":"clip2 move"}',
+}
 
 
 class _FakeClient:
@@ -22,11 +29,8 @@ class _FakeClient:
 
     def chat(self, *, model: str, system_prompt: str, user_prompt: str) -> str:
         self.calls.append((model, user_prompt))
-        if "Caption:" in user_prompt:
-            if "split_prompt_workflow=true" in system_prompt:
-                return '{"clip_1":"clip1 move", "clip_2":"clip2 move"}'
-            return "single motion prompt"
-        return "caption for image"
+        stage = "motion" if "Caption:" in user_prompt else "caption"
+        return _FAKE_RESPONSES[stage, stage == "motion" and "split_prompt_workflow=true" in system_prompt]
 
 
 class _DownClient:
@@ -40,9 +44,19 @@ class _DownClient:
         raise AssertionError("should not chat when unavailable")
 
 
+@functools.lru_cache(maxsize=1)
+def _workflows():
+    return {wf.name: wf for wf in load_all(ROOT / "workflow_defs_v2")}
+
+
 def _workflow(name: str):
-    workflows = {wf.name: wf for wf in load_all(ROOT / "workflow_defs_v2")}
-    return workflows[name]
+    return _workflows()[name]
+
+
+@functools.lru_cache(maxsize=None)
+def _context(name: str):
+    # Contexts are immutable; tests that only consume one share it instead of re-deriving it.
+    return AutoPromptGenerator.extract_workflow_context(_workflow(name))
 
 
 def test_generator_defaults_and_context_extraction_for_split_workflow():
@@ -59,14 +73,12 @@ def test_generator_defaults_and_context_extraction_for_split_workflow():
     assert ctx.marker_2 == 3.0
 
 
-def test_generate_batch_callback_contract_caption_and_motion(tmp_path: Path):
-    wf = _workflow("wan-context-2stage")
+def test_generate_batch_callback_contract_caption_and_motion(tmp_path: Path, stub_pngs):
     client = _FakeClient()
     gen = AutoPromptGenerator(client=client)
-    ctx = gen.extract_workflow_context(wf)
+    ctx = _context("wan-context-2stage")
 
-    img = tmp_path / "a.png"
-    img.write_bytes(b"\x89PNG\r\n\x1a\n")
+    [img] = stub_pngs(tmp_path, "a.png")
 
     seen: list[tuple[str, str, int, int]] = []
 
@@ -94,13 +106,11 @@ def test_generator_unavailable_raises():
     assert raised is True
 
 
-def test_generate_motion_from_supplied_captions_without_stage1(tmp_path: Path):
-    wf = _workflow("wan-context-2stage")
+def test_generate_motion_from_supplied_captions_without_stage1(tmp_path: Path, stub_pngs):
     client = _FakeClient()
     gen = AutoPromptGenerator(client=client)
-    ctx = gen.extract_workflow_context(wf)
-    img = tmp_path / "c.png"
-    img.write_bytes(b"\x89PNG\r\n\x1a\n")
+    ctx = _context("wan-context-2stage")
+    [img] = stub_pngs(tmp_path, "c.png")
 
     out = gen.generate_batch(
         [img],
@@ -122,3 +132,4 @@ def test_ensure_required_models_loaded_by_stage():
     client.ensure_calls.clear()
     gen.ensure_required_models_loaded(stage="motion")
     assert client.ensure_calls == [("Dolphin-Mistral-24B-Venice-Edition", True)]
+
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import comfy_client
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt: str, *args: object) -> None:  # pragma: no cover
+        return
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1  # type: ignore[attr-defined]
+
+    def do_GET(self) -> None:  # noqa: N802
+        status, payload = (200, {"ok": True}) if self.path == "/system_stats" else (400, {"error": "bad prompt"})
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _history(prompt_id: str, completed: bool) -> dict[str, Any]:
+    entry: dict[str, Any] = {"status": {"completed": completed, "status_str": "success" if completed else "running"}}
+    if completed:
+        entry["outputs"] = {"9": {"images": [{"filename": "a.png", "subfolder": "image/test"}]}}
+    return {prompt_id: entry}
+
+
+def test_get_outputs_reuses_history_entry_from_completed_poll(monkeypatch: pytest.MonkeyPatch):
+    calls: list[str] = []
+    responses = [_history("pid-1", False), _history("pid-1", True)]
+
+    def fake_request_json(method: str, base_url: str, path: str, payload: Any = None) -> Any:
+        calls.append(path)
+        return responses.pop(0)
+
+    monkeypatch.setattr(comfy_client, "_request_json", fake_request_json)
+
+    assert comfy_client.poll_until_done("http://comfy", "pid-1", poll_interval=0) == (True, "success")
+    assert comfy_client.get_outputs("http://comfy", "pid-1") == ["image/test/a.png"]
+    assert calls == ["/history/pid-1", "/history/pid-1"]
+
+
+def test_get_outputs_fetches_history_when_not_cached(monkeypatch: pytest.MonkeyPatch):
+    calls: list[str] = []
+
+    def fake_request_json(method: str, base_url: str, path: str, payload: Any = None) -> Any:
+        calls.append(path)
+        return _history("a b", True)
+
+    monkeypatch.setattr(comfy_client, "_request_json", fake_request_json)
+
+    assert comfy_client.get_outputs("http://comfy", "a b") == ["image/test/a.png"]
+    assert calls == ["/history/a%20b"]
+
+
+def test_get_queue_prompt_ids_reuses_fresh_listing_and_tracks_new_prompts(monkeypatch: pytest.MonkeyPatch):
+    calls: list[str] = []
+
+    def fake_request_json(method: str, base_url: str, path: str, payload: Any = None) -> Any:
+        calls.append(path)
+        if path == "/prompt":
+            return {"prompt_id": "pid-new"}
+        if path.startswith("/history/"):
+            return {"pid-running": {"status": {"completed": False, "status_str": "error"}}}
+        return {"queue_running": [[0, "pid-running"]], "queue_pending": [[1, "pid-pending"]]}
+
+    monkeypatch.setattr(comfy_client, "_request_json", fake_request_json)
+    monkeypatch.setattr(comfy_client, "_queue_ids_cache", {})
+
+    assert comfy_client.get_queue_prompt_ids("http://comfy") == {"pid-running", "pid-pending"}
+    comfy_client.queue_prompt("http://comfy", {})
+    assert comfy_client.get_queue_prompt_ids("http://comfy") == {"pid-running", "pid-pending", "pid-new"}
+    comfy_client.get_history_entry("http://comfy", "pid-running")
+    assert comfy_client.get_queue_prompt_ids("http://comfy") == {"pid-pending", "pid-new"}
+    assert calls == ["/queue", "/prompt", "/history/pid-running"]
+
+
+def test_requests_reuse_keep_alive_connection_and_map_http_errors():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.connections = 0  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert comfy_client.health_check(base_url) is True
+        assert comfy_client.health_check(base_url) is True
+        with pytest.raises(comfy_client.ComfyValidationError, match="bad prompt"):
+            comfy_client.get_history_entry(base_url, "pid-1")
+        assert server.connections == 1  # type: ignore[attr-defined]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+class _StaleConnection:
+    def __init__(self, sent: list[str]) -> None:
+        self.sent = sent
+
+    def request(self, method: str, target: str, body: bytes | None = None, headers: Any = None) -> None:
+        self.sent.append(method)
+
+    def getresponse(self) -> Any:
+        raise ConnectionResetError("peer dropped idle keep-alive socket")
+
+    def close(self) -> None:
+        return
+
+
+class _FreshConnection(_StaleConnection):
+    def getresponse(self) -> Any:
+        return SimpleNamespace(status=200, read=lambda: b'{"prompt_id": "pid-1"}')
+
+
+def test_stale_keep_alive_get_is_retried_once_on_a_fresh_connection(monkeypatch: pytest.MonkeyPatch):
+    sent: list[str] = []
+    monkeypatch.setattr(comfy_client._local, "conns", {("http", "comfy"): _StaleConnection(sent)}, raising=False)
+    monkeypatch.setattr(comfy_client, "_open_connection", lambda _scheme, _netloc: _FreshConnection(sent))
+
+    assert comfy_client._request_json("GET", "http://comfy", "/history/pid-1") == {"prompt_id": "pid-1"}
+    assert sent == ["GET", "GET"]
+
+
+class _DropIdleSocketHandler(_KeepAliveHandler):
+    served_get = False
+
+    def do_GET(self) -> None:  # noqa: N802
+        super().do_GET()
+        self.served_get = True
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.rfile.read(int(self.headers.get("Content-Length", "0") or "0"))
+        if self.served_get:
+            # The kept-alive socket expires as the POST arrives: dropped with no response.
+            self.close_connection = True
+            return
+        body = json.dumps({"prompt_id": "pid-1"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_queue_prompt_never_uses_a_kept_alive_socket_the_server_may_drop():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DropIdleSocketHandler)
+    server.connections = 0  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert comfy_client.health_check(base_url) is True
+        assert comfy_client.queue_prompt(base_url, {}) == "pid-1"
+        assert server.connections == 2  # type: ignore[attr-defined]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+@pytest.mark.parametrize(
+    ("payload", "expected"),
+    [
+        ({"error": "prompt has no outputs"}, "prompt has no outputs"),
+        (
+            {"error": {"type": "prompt_outputs_failed_validation"}, "node_errors": {"3": ["bad"]}},
+            '{"type": "prompt_outputs_failed_validation"} | {"3": ["bad"]}',
+        ),
+        ({"message": "oops", "details": None}, "oops | None"),
+        ({"unexpected": 1}, '{"unexpected": 1}'),
+        (["a"], '["a"]'),
+    ],
+)
+def test_extract_error_detail_shapes(payload: Any, expected: str):
+    assert comfy_client._extract_error_detail(payload) == expected
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from pathlib import Path
 from types import SimpleNamespace
 
 from db import QueueDB
@@ -10,8 +9,8 @@ def _spec(name: str, seed: int = 1):
     return SimpleNamespace(input_file=name, prompt_json={"name": name}, seed_used=seed)
 
 
-def test_mixed_succeeded_and_canceled_resolves_to_canceled(tmp_path: Path):
-    db = QueueDB(tmp_path / "queue.db")
+def test_mixed_succeeded_and_canceled_resolves_to_canceled():
+    db = QueueDB(":memory:")
     try:
         job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png"), _spec("b.png")])
         prompts = db.get_prompts_for_job(job_id)
@@ -25,8 +24,8 @@ def test_mixed_succeeded_and_canceled_resolves_to_canceled(tmp_path: Path):
         db.close()
 
 
-def test_cancel_running_job_sets_cancel_after_current(tmp_path: Path):
-    db = QueueDB(tmp_path / "queue.db")
+def test_cancel_running_job_sets_cancel_after_current():
+    db = QueueDB(":memory:")
     try:
         job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png"), _spec("b.png")])
         prompts = db.get_prompts_for_job(job_id)
@@ -42,3 +41,26 @@ def test_cancel_running_job_sets_cancel_after_current(tmp_path: Path):
         assert detail["job"]["status"] == "running"
     finally:
         db.close()
+
+
+def test_try_cancel_pending_only_cancels_when_job_requested_it():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png")])
+        prompt_id = int(db.get_prompts_for_job(job_id)[0]["id"])
+
+        assert db.claim_next_prompt()["id"] == prompt_id
+        assert db.try_cancel_pending(prompt_id, job_id) is False
+        assert db.get_prompts_for_job(job_id)[0]["status"] == "running"
+
+        db.conn.execute("UPDATE jobs SET cancel_requested=1 WHERE id=?", (job_id,))
+        db.conn.commit()
+        assert db.try_cancel_pending(prompt_id, job_id) is True
+
+        detail = db.get_job(job_id)
+        assert detail["prompts"][0]["status"] == "canceled"
+        assert detail["prompts"][0]["error_detail"] == "canceled before execution"
+        assert detail["prompts"][0]["started_at"] is None
+        assert detail["job"]["status"] == "canceled"
+    finally:
+        db.close()
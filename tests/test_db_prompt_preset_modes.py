@@ -3,8 +3,8 @@ from __future__ import annotations
 from db import QueueDB
 
 
-def test_prompt_presets_can_be_filtered_by_mode(tmp_path):
-    db = QueueDB(tmp_path / "queue.db")
+def test_prompt_presets_can_be_filtered_by_mode():
+    db = QueueDB(":memory:")
     try:
         db.save_prompt_preset("walk", "a", "b", mode="video_gen")
         db.save_prompt_preset("interp", "c", "d", mode="video_upscale")
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from db import QueueDB
+
+
+def _spec(name: str, seed: int = 1):
+    return SimpleNamespace(input_file=name, prompt_json={"name": name}, seed_used=seed)
+
+
+def test_update_prompt_and_job_status_writes_both_rows():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png")])
+        prompt_id = int(db.get_prompts_for_job(job_id)[0]["id"])
+
+        status = db.update_prompt_and_job_status(prompt_id, job_id, "succeeded", exit_status="success")
+
+        assert status == "succeeded"
+        detail = db.get_job(job_id)
+        assert detail["job"]["status"] == "succeeded"
+        assert detail["prompts"][0]["exit_status"] == "success"
+        assert not db.conn.in_transaction
+    finally:
+        db.close()
+
+
+def test_txn_rolls_back_all_writes_on_error():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png")])
+        prompt_id = int(db.get_prompts_for_job(job_id)[0]["id"])
+
+        with pytest.raises(RuntimeError):
+            with db._txn():
+                db.update_prompt_status(prompt_id, "running")
+                db.pause()
+                raise RuntimeError("boom")
+
+        assert db.get_prompts_for_job(job_id)[0]["status"] == "pending"
+        assert db.is_paused() is False
+    finally:
+        db.close()
+
+
+def test_update_job_status_aggregates_prompt_states_and_timestamps():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png"), _spec("b.png")])
+        first, second = (int(p["id"]) for p in db.get_prompts_for_job(job_id))
+
+        assert db.update_job_status(job_id) == "pending"
+        assert db.get_job(job_id)["job"]["started_at"] is None
+
+        assert db.update_prompt_and_job_status(first, job_id, "running") == "running"
+        started_at = db.get_job(job_id)["job"]["started_at"]
+        assert started_at
+        assert db.get_job(job_id)["job"]["finished_at"] is None
+
+        db.update_prompt_status(first, "succeeded")
+        assert db.update_prompt_and_job_status(second, job_id, "failed") == "failed"
+        job = db.get_job(job_id)["job"]
+        assert job["started_at"] == started_at
+        assert job["finished_at"]
+
+        assert db.update_job_status(9999) == "pending"
+    finally:
+        db.close()
+
+
+def test_create_job_inserts_prompts_in_order_across_chunks():
+    db = QueueDB(":memory:")
+    try:
+        names = [f"{idx:03d}.png" for idx in range(450)]
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec(name, seed=idx) for idx, name in enumerate(names)])
+
+        prompts = db.get_prompts_for_job(job_id)
+        assert [p["input_file"] for p in prompts] == names
+        assert [p["seed_used"] for p in prompts] == list(range(450))
+        assert {p["status"] for p in prompts} == {"pending"}
+        assert {p["output_paths"] for p in prompts} == {"[]"}
+    finally:
+        db.close()
+
+
+def test_finalize_prompt_writes_prompt_log_path_and_cancel_sweep_in_one_commit():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png"), _spec("b.png")])
+        first = int(db.get_prompts_for_job(job_id)[0]["id"])
+        db.update_prompt_and_job_status(first, job_id, "running")
+        db.conn.execute("UPDATE jobs SET cancel_requested=1 WHERE id=?", (job_id,))
+        db.conn.commit()
+
+        status = db.finalize_prompt(first, job_id, "succeeded", log_path="/tmp/job.log", exit_status="success")
+
+        assert status == "canceled"
+        detail = db.get_job(job_id)
+        assert detail["job"]["log_path"] == "/tmp/job.log"
+        assert [p["status"] for p in detail["prompts"]] == ["succeeded", "canceled"]
+        assert not db.conn.in_transaction
+    finally:
+        db.close()
+
+
+def test_claim_next_prompt_marks_rows_running_one_at_a_time():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png"), _spec("b.png")])
+        first, second = (int(p["id"]) for p in db.get_prompts_for_job(job_id))
+
+        claimed = db.claim_next_prompt()
+        assert claimed["id"] == first
+        assert claimed["status"] == "running"
+        assert db.get_job(job_id)["job"]["status"] == "running"
+
+        assert db.claim_next_prompt()["id"] == second
+        assert db.claim_next_prompt() is None
+        assert {p["status"] for p in db.get_prompts_for_job(job_id)} == {"running"}
+        assert not db.conn.in_transaction
+    finally:
+        db.close()
+
+
+def test_txn_keeps_other_threads_writes_out_of_an_open_transaction():
+    db = QueueDB(":memory:")
+    try:
+        job_id = db.create_job("wf", None, "/tmp", {}, [_spec("a.png")])
+        prompt_id = int(db.get_prompts_for_job(job_id)[0]["id"])
+        pauser = threading.Thread(target=db.pause)
+
+        with pytest.raises(RuntimeError):
+            with db._txn():
+                db.update_prompt_status(prompt_id, "running")
+                pauser.start()
+                pauser.join(timeout=0.2)
+                assert pauser.is_alive(), "another thread's write must wait for the open transaction"
+                raise RuntimeError("boom")
+        pauser.join(timeout=5)
+
+        assert db.get_prompts_for_job(job_id)[0]["status"] == "pending"
+        assert db.is_paused() is True
+    finally:
+        db.close()
+
+
+def test_queue_db_rejects_sqlite_without_update_from_and_returning(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+    monkeypatch.setattr(sqlite3, "sqlite_version", "3.31.1")
+
+    with pytest.raises(RuntimeError, match=r"SQLite 3\.35\.0\+ is required.*3\.31\.1"):
+        QueueDB(":memory:")
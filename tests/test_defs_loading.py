@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from defs import WorkflowDefError, load_all, load_one
+
+
+def _write_workflow(defs_dir: Path, description: str) -> Path:
+    path = defs_dir / "wf.yaml"
+    path.write_text(
+        f"""
+name: wf
+description: "{description}"
+input_type: none
+input_extensions: [.png]
+template: template.json
+parameters:
+  positive_prompt:
+    label: Positive
+    type: text
+    nodes: ["1"]
+    field: text
+""".strip(),
+        encoding="utf-8",
+    )
+    return path
+
+
+def _write_template(defs_dir: Path, text: str) -> Path:
+    path = defs_dir / "template.json"
+    path.write_text(json.dumps({"1": {"class_type": "CLIPTextEncode", "inputs": {"text": text}}}), encoding="utf-8")
+    return path
+
+
+def _bump_mtime(path: Path) -> None:
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_load_all_reuses_unchanged_definitions(tmp_path: Path):
+    _write_workflow(tmp_path, "first")
+    _write_template(tmp_path, "default")
+
+    first = load_all(tmp_path)
+    second = load_all(tmp_path)
+
+    assert first[0] is second[0]
+
+
+def test_load_all_reloads_when_yaml_or_template_changes(tmp_path: Path):
+    yaml_path = _write_workflow(tmp_path, "first")
+    template_path = _write_template(tmp_path, "default")
+    original = load_all(tmp_path)[0]
+
+    _write_workflow(tmp_path, "second")
+    _bump_mtime(yaml_path)
+    reloaded = load_all(tmp_path)[0]
+    assert reloaded is not original
+    assert reloaded.description == "second"
+
+    _write_template(tmp_path, "changed")
+    _bump_mtime(template_path)
+    retemplated = load_all(tmp_path)[0]
+    assert retemplated is not reloaded
+    assert retemplated.template_prompt["1"]["inputs"]["text"] == "changed"
+
+
+def test_load_all_shares_identical_template_prompts(tmp_path: Path):
+    yaml_path = _write_workflow(tmp_path, "first")
+    yaml_path.with_name("wf2.yaml").write_text(yaml_path.read_text().replace("name: wf", "name: wf2"), encoding="utf-8")
+    _write_template(tmp_path, "default")
+
+    first, second = load_all(tmp_path)
+
+    assert (first.name, second.name) == ("wf", "wf2")
+    assert first.template_prompt is second.template_prompt
+    assert first.clone_template_prompt() == second.clone_template_prompt()
+
+
+def test_load_all_rejects_duplicate_names_across_parallel_loads(tmp_path: Path):
+    yaml_path = _write_workflow(tmp_path, "first")
+    yaml_path.with_name("wf_copy.yaml").write_text(yaml_path.read_text(), encoding="utf-8")
+    _write_template(tmp_path, "default")
+
+    with pytest.raises(WorkflowDefError, match="duplicate workflow name 'wf'.*wf_copy.yaml"):
+        load_all(tmp_path)
+
+
+def test_load_one_rejects_targeted_nodes_without_inputs(tmp_path: Path):
+    path = _write_workflow(tmp_path, "first")
+    (tmp_path / "template.json").write_text(json.dumps({"1": {"class_type": "CLIPTextEncode"}}), encoding="utf-8")
+
+    with pytest.raises(WorkflowDefError, match="parameters.positive_prompt.nodes.*node id '1' has no inputs mapping"):
+        load_one(path)
+
+
+def test_load_one_rejects_non_json_inline_templates(tmp_path: Path):
+    path = tmp_path / "wf.yaml"
+    path.write_text(
+        """
+name: wf
+description: inline
+input_type: none
+input_extensions: [.png]
+template_inline:
+  "1": {"class_type": "Note", "inputs": {"created": 2024-01-01}}
+""".strip(),
+        encoding="utf-8",
+    )
+
+    with pytest.raises(WorkflowDefError, match="template_inline.*must be JSON-serializable"):
+        load_one(path)
@@ -1,17 +1,27 @@
 from __future__ import annotations
 
 import subprocess
+import tempfile
 from pathlib import Path
 
 
 def test_frontend_state_node_suite_passes():
     root = Path(__file__).resolve().parents[1]
-    proc = subprocess.run(
-        ["node", "--test", str(root / "tests" / "frontend_state.test.mjs")],
-        cwd=str(root),
-        capture_output=True,
-        text=True,
-        check=False,
-    )
-    if proc.returncode != 0:
-        raise AssertionError(f"node frontend suite failed\nSTDOUT:\n{proc.stdout}\nSTDERR:\n{proc.stderr}")
+    # One `node --test` run for every frontend suite, so Node/V8 startup is paid once per session.
+    suites = sorted(str(path) for path in (root / "tests").glob("*.test.mjs"))
+    assert suites, "no frontend node suites found"
+    # TAP output goes to temp files and is only decoded when the suite fails.
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        proc = subprocess.run(
+            ["node", "--test", *suites],
+            cwd=str(root),
+            stdout=stdout,
+            stderr=stderr,
+            check=False,
+        )
+        if proc.returncode != 0:
+            stdout.seek(0)
+            stderr.seek(0)
+            out = stdout.read().decode("utf-8", errors="replace")
+            err = stderr.read().decode("utf-8", errors="replace")
+            raise AssertionError(f"node frontend suite failed\nSTDOUT:\n{out}\nSTDERR:\n{err}")
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from defs import ParameterDef
+
+
+@pytest.mark.parametrize(
+    ("param", "raw", "expected"),
+    [
+        (ParameterDef(name="p", label="P", type="text"), None, ""),
+        (ParameterDef(name="p", label="P", type="text"), 12, "12"),
+        (ParameterDef(name="p", label="P", type="bool"), " Yes ", True),
+        (ParameterDef(name="p", label="P", type="bool"), "off", False),
+        (ParameterDef(name="p", label="P", type="int"), "7", 7),
+        (ParameterDef(name="p", label="P", type="int", min=1, max=10), 10, 10),
+        (ParameterDef(name="p", label="P", type="float", min=0.0), "0.5", 0.5),
+        (ParameterDef(name="p", label="P", type="float", max=1.0), 1, 1.0),
+    ],
+)
+def test_parameter_coercer_converts_values(param: ParameterDef, raw: Any, expected: Any):
+    out = param._coercer(raw)
+    assert out == expected
+    assert type(out) is type(expected)
+
+
+@pytest.mark.parametrize(
+    ("param", "raw", "message"),
+    [
+        (ParameterDef(name="p", label="P", type="bool"), "maybe", "parameter 'p' must be bool"),
+        (ParameterDef(name="p", label="P", type="int"), True, "parameter 'p' must be int"),
+        (ParameterDef(name="p", label="P", type="int"), "x", "parameter 'p' must be int"),
+        (ParameterDef(name="p", label="P", type="float"), None, "parameter 'p' must be float"),
+        (ParameterDef(name="p", label="P", type="int", min=1), 0, "parameter 'p' below min 1"),
+        (ParameterDef(name="p", label="P", type="float", max=1.0), 1.5, "parameter 'p' above max 1.0"),
+        (ParameterDef(name="p", label="P", type="int", min=1, max=3), 4, "parameter 'p' above max 3"),
+        (ParameterDef(name="p", label="P", type="list"), 1, "unsupported parameter type: list"),
+    ],
+)
+def test_parameter_coercer_rejects_invalid_values(param: ParameterDef, raw: Any, message: str):
+    with pytest.raises(ValueError) as exc_info:
+        param._coercer(raw)
+    assert str(exc_info.value) == message
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+import json
 from pathlib import Path
 
 from defs import load_all, load_one
@@ -9,10 +11,15 @@ from prompt_builder import build_prompts
 ROOT = Path(__file__).resolve().parents[1]
 
 
+@functools.lru_cache(maxsize=1)
+def _workflows():
+    return {wf.name: wf for wf in load_all(ROOT / "workflow_defs_v2")}
+
+
 def _workflow(name: str):
-    workflows = {wf.name: wf for wf in load_all(ROOT / "workflow_defs_v2")}
-    assert name in workflows, f"workflow not found: {name}"
-    return workflows[name]
+    wf = _workflows().get(name)
+    assert wf is not None, f"workflow not found: {name}"
+    return wf
 
 
 def test_upscale_images_workflow_definition_loads_with_expected_defaults():
@@ -25,11 +32,8 @@ def test_upscale_images_workflow_definition_loads_with_expected_defaults():
     assert float(wf.parameters["final_scale_factor"].default) == 0.75
 
 
-def test_2stage_split_prompt_values_map_to_stage_nodes(tmp_path: Path):
+def test_2stage_split_prompt_values_map_to_stage_nodes(sample_png: Path):
     wf = _workflow("wan-context-2stage-split-prompts")
-    image = tmp_path / "sample.png"
-    image.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     params = {
         "positive_prompt_stage1": "stage one action",
         "positive_prompt_stage2": "stage two continuation",
@@ -37,7 +41,7 @@ def test_2stage_split_prompt_values_map_to_stage_nodes(tmp_path: Path):
         "randomize_seed": False,
         "tries": 1,
     }
-    specs = build_prompts(wf, [image], params, comfy_input_dir=tmp_path)
+    specs = build_prompts(wf, [sample_png], params, comfy_input_dir=sample_png.parent)
     assert len(specs) == 1
 
     prompt = specs[0].prompt_json
@@ -46,11 +50,8 @@ def test_2stage_split_prompt_values_map_to_stage_nodes(tmp_path: Path):
     assert prompt["89"]["inputs"]["text"] == "bad anatomy, artifacts"
 
 
-def test_3stage_split_prompt_mapping_and_seed_bindings_cover_all_samplers(tmp_path: Path):
+def test_3stage_split_prompt_mapping_and_seed_bindings_cover_all_samplers(sample_png: Path):
     wf = _workflow("wan-context-3stage-split-prompts")
-    image = tmp_path / "sample.png"
-    image.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     params = {
         "positive_prompt_stage1": "stage one",
         "positive_prompt_stage2": "stage two",
@@ -59,7 +60,7 @@ def test_3stage_split_prompt_mapping_and_seed_bindings_cover_all_samplers(tmp_pa
         "randomize_seed": True,
         "tries": 1,
     }
-    specs = build_prompts(wf, [image], params, comfy_input_dir=tmp_path)
+    specs = build_prompts(wf, [sample_png], params, comfy_input_dir=sample_png.parent)
     assert len(specs) == 1
 
     spec = specs[0]
@@ -71,23 +72,18 @@ def test_3stage_split_prompt_mapping_and_seed_bindings_cover_all_samplers(tmp_pa
     assert prompt["293"]["inputs"]["text"] == "stage three"
 
     seed = int(spec.seed_used)
-    for node_id in ["86", "85", "120", "121", "130", "131"]:
+    for node_id in ("86", "85", "120", "121", "130", "131"):
         inputs = prompt[node_id]["inputs"]
-        if "noise_seed" in inputs:
-            assert int(inputs["noise_seed"]) == seed
-        if "seed" in inputs:
-            assert int(inputs["seed"]) == seed
+        bound = [inputs[field] for field in ("noise_seed", "seed") if field in inputs]
+        assert bound and all(int(value) == seed for value in bound), node_id
 
 
-def test_extra_lora_enable_flag_controls_strength_application(tmp_path: Path):
+def test_extra_lora_enable_flag_controls_strength_application(sample_png: Path):
     wf = _workflow("wan-context-2stage")
-    image = tmp_path / "sample.png"
-    image.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     # Disabled extra LoRA should always force strength to 0, even if strength is provided.
     specs_disabled = build_prompts(
         wf,
-        [image],
+        [sample_png],
         {
             "randomize_seed": False,
             "tries": 1,
@@ -95,7 +91,7 @@ def test_extra_lora_enable_flag_controls_strength_application(tmp_path: Path):
             "extra_lora_strength_high": 1.25,
             "extra_lora_strength_low": 1.1,
         },
-        comfy_input_dir=tmp_path,
+        comfy_input_dir=sample_png.parent,
     )
     p0 = specs_disabled[0].prompt_json
     assert float(p0["201"]["inputs"]["strength_model"]) == 0.0
@@ -104,7 +100,7 @@ def test_extra_lora_enable_flag_controls_strength_application(tmp_path: Path):
     # Enabled extra LoRA should use configured strength.
     specs_enabled = build_prompts(
         wf,
-        [image],
+        [sample_png],
         {
             "randomize_seed": False,
             "tries": 1,
@@ -114,24 +110,21 @@ def test_extra_lora_enable_flag_controls_strength_application(tmp_path: Path):
             "extra_lora_strength_high": 1.25,
             "extra_lora_strength_low": 1.1,
         },
-        comfy_input_dir=tmp_path,
+        comfy_input_dir=sample_png.parent,
     )
     p1 = specs_enabled[0].prompt_json
     assert float(p1["201"]["inputs"]["strength_model"]) == 1.25
     assert float(p1["202"]["inputs"]["strength_model"]) == 1.1
 
 
-def test_single_pass_workflow_keeps_core_4step_lora_and_exposes_two_extra_slots(tmp_path: Path):
+def test_single_pass_workflow_keeps_core_4step_lora_and_exposes_two_extra_slots(sample_png: Path):
     wf = _workflow("wan-context-lite-2stage")
-    image = tmp_path / "sample.png"
-    image.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     assert "lora_high_name" not in wf.parameters
     assert "lora_low_name" not in wf.parameters
     assert "extra_lora_enabled" in wf.parameters
     assert "extra_lora2_enabled" in wf.parameters
 
-    specs = build_prompts(wf, [image], {"randomize_seed": False, "tries": 1}, comfy_input_dir=tmp_path)
+    specs = build_prompts(wf, [sample_png], {"randomize_seed": False, "tries": 1}, comfy_input_dir=sample_png.parent)
     prompt = specs[0].prompt_json
     assert prompt["101"]["inputs"]["lora_name"] == "wan2.2_i2v_lightx2v_4steps_lora_v1_high_noise.safetensors"
     assert prompt["102"]["inputs"]["lora_name"] == "wan2.2_i2v_lightx2v_4steps_lora_v1_low_noise.safetensors"
@@ -144,14 +137,11 @@ def test_single_pass_workflow_keeps_core_4step_lora_and_exposes_two_extra_slots(
     assert prompt["103"]["inputs"]["model"][0] == "102"
 
 
-def test_single_pass_enabled_extra_slot_requires_non_empty_names(tmp_path: Path):
+def test_single_pass_enabled_extra_slot_requires_non_empty_names(sample_png: Path):
     wf = _workflow("wan-context-lite-2stage")
-    image = tmp_path / "sample.png"
-    image.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     specs = build_prompts(
         wf,
-        [image],
+        [sample_png],
         {
             "randomize_seed": False,
             "tries": 1,
@@ -161,7 +151,7 @@ def test_single_pass_enabled_extra_slot_requires_non_empty_names(tmp_path: Path)
             "extra_lora_strength_high": 1.0,
             "extra_lora_strength_low": 1.0,
         },
-        comfy_input_dir=tmp_path,
+        comfy_input_dir=sample_png.parent,
     )
     prompt = specs[0].prompt_json
     # Missing names should deactivate slot and preserve baseline path.
@@ -214,12 +204,9 @@ parameters:
     assert specs[1].output_prefix.endswith("prompt_try02")
 
 
-def test_per_file_params_override_single_prompt_per_image(tmp_path: Path):
+def test_per_file_params_override_single_prompt_per_image(tmp_path: Path, stub_pngs):
     wf = _workflow("wan-context-2stage")
-    a = tmp_path / "a.png"
-    b = tmp_path / "b.png"
-    a.write_bytes(b"\x89PNG\r\n\x1a\n")
-    b.write_bytes(b"\x89PNG\r\n\x1a\n")
+    a, b = stub_pngs(tmp_path, "a.png", "b.png")
 
     specs = build_prompts(
         wf,
@@ -236,14 +223,11 @@ def test_per_file_params_override_single_prompt_per_image(tmp_path: Path):
     assert specs[1].prompt_json["93"]["inputs"]["text"] == "prompt B"
 
 
-def test_per_file_params_override_split_prompt_fields(tmp_path: Path):
+def test_per_file_params_override_split_prompt_fields(sample_png: Path):
     wf = _workflow("wan-context-2stage-split-prompts")
-    img = tmp_path / "sample.png"
-    img.write_bytes(b"\x89PNG\r\n\x1a\n")
-
     specs = build_prompts(
         wf,
-        [img],
+        [sample_png],
         {
             "positive_prompt_stage1": "global one",
             "positive_prompt_stage2": "global two",
@@ -252,13 +236,124 @@ def test_per_file_params_override_split_prompt_fields(tmp_path: Path):
             "tries": 1,
         },
         per_file_params={
-            str(img.resolve()): {
+            str(sample_png.resolve()): {
                 "positive_prompt_stage1": "override one",
                 "positive_prompt_stage2": "override two",
             }
         },
-        comfy_input_dir=tmp_path,
+        comfy_input_dir=sample_png.parent,
     )
     prompt = specs[0].prompt_json
     assert prompt["93"]["inputs"]["text"] == "override one"
     assert prompt["193"]["inputs"]["text"] == "override two"
+
+
+def test_candidate_fields_follow_inputs_written_by_earlier_parameters(tmp_path: Path):
+    path = tmp_path / "wf.yaml"
+    path.write_text(
+        """
+name: wf
+description: candidate fields
+input_type: none
+input_extensions: [.png]
+template_inline:
+  "1": {"class_type": "Node", "inputs": {"b": "template"}}
+  "2": {"class_type": "Node", "inputs": {"b": "template"}}
+parameters:
+  first:
+    type: text
+    default: first
+    nodes: ["1"]
+    field: a
+  pick:
+    type: text
+    default: picked
+    nodes: ["1", "2"]
+    fields: [a, b]
+""".strip(),
+        encoding="utf-8",
+    )
+    wf = load_one(path)
+
+    assert wf._param_targets["first"] == (("1", "a"),)
+    assert wf._param_targets["pick"] == (("1", None), ("2", "b"))
+
+    prompt = build_prompts(wf, [], {})[0].prompt_json
+    assert prompt["1"]["inputs"] == {"a": "picked", "b": "template"}
+    assert prompt["2"]["inputs"] == {"b": "picked"}
+
+
+def test_input_paths_are_relative_only_under_comfy_input_dir(tmp_path: Path, stub_pngs):
+    wf = _workflow("wan-context-2stage")
+    comfy_input = tmp_path / "input"
+    (comfy_input / "sub").mkdir(parents=True)
+    (tmp_path / "input-other").mkdir()
+    [inside] = stub_pngs(comfy_input / "sub", "a.png")
+    [outside] = stub_pngs(tmp_path / "input-other", "b.png")
+
+    specs = build_prompts(wf, [inside, outside], {"tries": 1}, comfy_input_dir=comfy_input)
+    binding = wf.file_bindings["load_image"]
+    field = binding.field or binding.fields[0]
+    assert [spec.prompt_json[binding.nodes[0]]["inputs"][field] for spec in specs] == ["sub/a.png", str(outside)]
+
+
+def test_resolution_and_flip_only_touch_numeric_dimensions(tmp_path: Path):
+    path = tmp_path / "wf.yaml"
+    path.write_text(
+        """
+name: wf
+description: dimensions
+input_type: none
+input_extensions: [.png]
+template_inline:
+  "1": {"class_type": "EmptyLatent", "inputs": {"width": 512, "height": 768}}
+  "2": {"class_type": "Resize", "inputs": {"width": 512, "height": 768}}
+  "3": {"class_type": "Text", "inputs": {"text": ""}}
+parameters:
+  resize_width:
+    type: text
+    default: auto
+    nodes: ["2"]
+    field: width
+""".strip(),
+        encoding="utf-8",
+    )
+    wf = load_one(path)
+
+    assert wf._resolution_node_ids == ("1",)
+    assert wf._dimension_node_ids == ("2",)
+
+    prompt = build_prompts(wf, [], {}, resolution=(640, 1136), flip_orientation=True)[0].prompt_json
+    assert prompt["1"]["inputs"] == {"width": 1136, "height": 640}
+    assert prompt["2"]["inputs"] == {"width": "auto", "height": 768}
+
+    prompt = build_prompts(wf, [], {"resize_width": "1024"}, flip_orientation=True)[0].prompt_json
+    assert prompt["1"]["inputs"] == {"width": 768, "height": 512}
+    assert prompt["2"]["inputs"] == {"width": "1024", "height": 768}
+
+
+def test_attempts_of_one_file_get_independent_prompts(sample_png: Path):
+    wf = _workflow("wan-context-2stage")
+    specs = build_prompts(wf, [sample_png], {"tries": 3}, comfy_input_dir=sample_png.parent)
+
+    assert [spec.output_prefix.rsplit("/", 1)[-1] for spec in specs] == ["sample_try01", "sample_try02", "sample_try03"]
+    seed_binding = wf.file_bindings["seed"]
+    prefix_binding = wf.file_bindings["output_prefix"]
+    for spec in specs:
+        seed_inputs = spec.prompt_json[seed_binding.nodes[0]]["inputs"]
+        assert spec.seed_used in {seed_inputs.get(field) for field in seed_binding.fields or [seed_binding.field]}
+        assert spec.prompt_json[prefix_binding.nodes[0]]["inputs"][prefix_binding.field] == spec.output_prefix
+    assert specs[0].prompt_json[seed_binding.nodes[0]] is not specs[1].prompt_json[seed_binding.nodes[0]]
+
+
+def test_build_prompts_never_mutates_shared_template(sample_png: Path):
+    for wf in _workflows().values():
+        before = json.dumps(wf.template_prompt, sort_keys=True)
+        files = [] if wf.input_type == "none" else [sample_png]
+        params = {name: True for name, pdef in wf.parameters.items() if pdef.type == "bool"}
+        specs = build_prompts(wf, files, params, comfy_input_dir=sample_png.parent, resolution=(640, 1136), flip_orientation=True)
+        for spec in specs:
+            for nid in wf._overlay_node_ids:
+                assert spec.prompt_json[nid] is not wf.template_prompt[nid]
+        assert json.dumps(wf.template_prompt, sort_keys=True) == before, wf.name
+
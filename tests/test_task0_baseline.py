@@ -1,65 +1,79 @@
 from __future__ import annotations
 
+import functools
+import importlib
+import io
 import json
-import os
 import re
-import subprocess
+import sys
+from contextlib import redirect_stderr, redirect_stdout
 from pathlib import Path
+from types import ModuleType
 from typing import Any
 
+import pytest
+
 from defs import load_all
 from prompt_builder import build_prompts, resolve_params
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 FIXTURES_ROOT = PROJECT_ROOT / "tests" / "fixtures" / "baseline"
-VENV_PYTHON = PROJECT_ROOT / "venv" / "bin" / "python"
+_TMP_PATH_RE = re.compile(r"/tmp/task0_cli_[^/\s]*/[^\s]*")
+
+
+@functools.lru_cache(maxsize=1)
+def _workflows() -> dict[str, Any]:
+    return {wf.name: wf for wf in load_all(PROJECT_ROOT / "workflow_defs_v2")}
 
 
 def _read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
+    return json.loads(path.read_bytes())
+
+
+_SEED_KEYS = frozenset({"seed", "noise_seed"})
 
 
 def _canonicalize_seed_fields(value: Any) -> Any:
+    # Only containers are recursed into; scalar leaves are copied as-is.
     if isinstance(value, dict):
         out: dict[str, Any] = {}
         for key, item in value.items():
-            if key in {"seed", "noise_seed"} and isinstance(item, int):
+            if key in _SEED_KEYS and isinstance(item, int):
                 out[key] = "__SEED__"
-            else:
+            elif isinstance(item, (dict, list)):
                 out[key] = _canonicalize_seed_fields(item)
+            else:
+                out[key] = item
         return out
     if isinstance(value, list):
-        return [_canonicalize_seed_fields(item) for item in value]
+        return [_canonicalize_seed_fields(item) if isinstance(item, (dict, list)) else item for item in value]
     return value
 
 
 def _serialize_specs(specs: list[Any]) -> list[dict[str, Any]]:
-    out: list[dict[str, Any]] = []
-    for spec in specs:
-        out.append(
-            {
-                "input_file": spec.input_file,
-                "output_prefix": spec.output_prefix,
-                "seed_used": "__SEED__" if spec.seed_used is not None else None,
-                "prompt_json": _canonicalize_seed_fields(spec.prompt_json),
-            }
-        )
-    return out
-
-
-def _run_cli(args: list[str], env: dict[str, str]) -> tuple[int, str, str]:
-    proc = subprocess.run(
-        [str(VENV_PYTHON), str(PROJECT_ROOT / "cli.py"), *args],
-        cwd=str(PROJECT_ROOT),
-        env=env,
-        capture_output=True,
-        text=True,
-    )
-    return proc.returncode, proc.stdout, proc.stderr
+    return [
+        {
+            "input_file": spec.input_file,
+            "output_prefix": spec.output_prefix,
+            "seed_used": "__SEED__" if spec.seed_used is not None else None,
+            "prompt_json": _canonicalize_seed_fields(spec.prompt_json),
+        }
+        for spec in specs
+    ]
+
 
+def _run_cli(cli: ModuleType, args: list[str]) -> tuple[int, str, str]:
+    out, err = io.StringIO(), io.StringIO()
+    with pytest.MonkeyPatch.context() as mp, redirect_stdout(out), redirect_stderr(err):
+        mp.setattr(sys, "argv", ["cli.py", *args])
+        code = cli.main()
+    return code, out.getvalue(), err.getvalue()
 
-def _prepare_cli_env(tmp_path: Path) -> tuple[dict[str, str], Path, Path]:
+
+@pytest.fixture(scope="module")
+def cli_env(tmp_path_factory: pytest.TempPathFactory):
+    tmp_path = tmp_path_factory.mktemp("task0_cli")
     queue_root = tmp_path / "queue_root"
     comfy_root = tmp_path / "comfy_root"
     input_dir = comfy_root / "input"
@@ -69,24 +83,25 @@ def _prepare_cli_env(tmp_path: Path) -> tuple[dict[str, str], Path, Path]:
     sample_image = input_dir / "sample.png"
     sample_image.write_bytes(b"\x89PNG\r\n\x1a\n")
 
-    env = os.environ.copy()
-    env.update(
-        {
-            # Intentionally unreachable so CLI fallback code paths are exercised.
-            "VIDEO_QUEUE_API": "http://127.0.0.1:9",
-            "VIDEO_QUEUE_ROOT": str(queue_root),
-            "WORKFLOW_DEFS_DIR": str(PROJECT_ROOT / "workflow_defs_v2"),
-            "COMFY_ROOT": str(comfy_root),
-        }
-    )
-    return env, input_dir, sample_image
+    # cli.py reads its configuration at import time, so import it once under the test env.
+    with pytest.MonkeyPatch.context() as mp:
+        # Intentionally unreachable so CLI fallback code paths are exercised.
+        mp.setenv("VIDEO_QUEUE_API", "http://127.0.0.1:9")
+        mp.setenv("VIDEO_QUEUE_ROOT", str(queue_root))
+        mp.setenv("WORKFLOW_DEFS_DIR", str(PROJECT_ROOT / "workflow_defs_v2"))
+        mp.setenv("COMFY_ROOT", str(comfy_root))
+        sys.modules.pop("cli", None)
+        cli = importlib.import_module("cli")
+    try:
+        yield cli, input_dir, sample_image
+    finally:
+        sys.modules.pop("cli", None)
 
 
 def _normalize_cli_dry_run_output(output: str, input_dir: Path, sample_image: Path) -> str:
     text = output.replace(str(sample_image), "<INPUT_IMAGE_PATH>")
     text = text.replace(str(input_dir), "<INPUT_DIR>")
-    text = re.sub(r"/tmp/task0_cli_[^/\s]*/[^\s]*", "<TMP_PATH>", text)
-    return text
+    return _TMP_PATH_RE.sub("<TMP_PATH>", text)
 
 
 def test_api_workflows_payload_schema_snapshot(queue_server):
@@ -114,100 +129,100 @@ def test_api_workflows_payload_schema_snapshot(queue_server):
     assert actual == expected
 
 
-def test_prompt_generation_golden_fixtures_cover_two_workflows_and_multi_try():
-    workflow_map = {wf.name: wf for wf in load_all(PROJECT_ROOT / "workflow_defs_v2")}
-
-    scenarios = [
-        {
-            "fixture": "wan-context-lite-2stage.single.json",
-            "workflow": "wan-context-lite-2stage",
-            "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
-            "params": {
-                "positive_prompt": "(at 0 second: alpha)(at 3 second: beta)(at 7 second: gamma)",
-                "negative_prompt": "bad anatomy",
-                "randomize_seed": False,
-                "tries": 1,
-                "output_prefix": "video/task0-lite",
-                "extra_lora_enabled": True,
-                "extra_lora_high_name": "lite_high.safetensors",
-                "extra_lora_low_name": "lite_low.safetensors",
-                "extra_lora_strength_high": 0.85,
-                "extra_lora_strength_low": 0.85,
-            },
+_GOLDEN_SCENARIOS = [
+    {
+        "fixture": "wan-context-lite-2stage.single.json",
+        "workflow": "wan-context-lite-2stage",
+        "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
+        "params": {
+            "positive_prompt": "(at 0 second: alpha)(at 3 second: beta)(at 7 second: gamma)",
+            "negative_prompt": "bad anatomy",
+            "randomize_seed": False,
+            "tries": 1,
+            "output_prefix": "video/task0-lite",
+            "extra_lora_enabled": True,
+            "extra_lora_high_name": "lite_high.safetensors",
+            "extra_lora_low_name": "lite_low.safetensors",
+            "extra_lora_strength_high": 0.85,
+            "extra_lora_strength_low": 0.85,
         },
-        {
-            "fixture": "wan-context-2stage.single.json",
-            "workflow": "wan-context-2stage",
-            "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
-            "params": {
-                "positive_prompt": "(at 0 second: cat)(at 3 second: walk)(at 7 second: city)",
-                "negative_prompt": "low quality",
-                "randomize_seed": False,
-                "tries": 1,
-                "output_prefix": "video/task0-main",
-                "extra_lora_enabled": True,
-                "extra_lora_high_name": "main_high.safetensors",
-                "extra_lora_low_name": "main_low.safetensors",
-                "extra_lora_strength_high": 1.0,
-                "extra_lora_strength_low": 1.0,
-            },
+    },
+    {
+        "fixture": "wan-context-2stage.single.json",
+        "workflow": "wan-context-2stage",
+        "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
+        "params": {
+            "positive_prompt": "(at 0 second: cat)(at 3 second: walk)(at 7 second: city)",
+            "negative_prompt": "low quality",
+            "randomize_seed": False,
+            "tries": 1,
+            "output_prefix": "video/task0-main",
+            "extra_lora_enabled": True,
+            "extra_lora_high_name": "main_high.safetensors",
+            "extra_lora_low_name": "main_low.safetensors",
+            "extra_lora_strength_high": 1.0,
+            "extra_lora_strength_low": 1.0,
         },
-        {
-            "fixture": "wan-context-lite-2stage.multi_try.json",
-            "workflow": "wan-context-lite-2stage",
-            "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
-            "params": {
-                "positive_prompt": "(at 0 second: alpha)(at 3 second: beta)(at 7 second: gamma)",
-                "negative_prompt": "bad anatomy",
-                "randomize_seed": False,
-                "tries": 3,
-                "output_prefix": "video/task0-lite",
-                "extra_lora_enabled": True,
-                "extra_lora_high_name": "lite_high.safetensors",
-                "extra_lora_low_name": "lite_low.safetensors",
-                "extra_lora_strength_high": 0.85,
-                "extra_lora_strength_low": 0.85,
-            },
+    },
+    {
+        "fixture": "wan-context-lite-2stage.multi_try.json",
+        "workflow": "wan-context-lite-2stage",
+        "input_files": [Path("/tmp/task0_comfy/input/sample.png")],
+        "params": {
+            "positive_prompt": "(at 0 second: alpha)(at 3 second: beta)(at 7 second: gamma)",
+            "negative_prompt": "bad anatomy",
+            "randomize_seed": False,
+            "tries": 3,
+            "output_prefix": "video/task0-lite",
+            "extra_lora_enabled": True,
+            "extra_lora_high_name": "lite_high.safetensors",
+            "extra_lora_low_name": "lite_low.safetensors",
+            "extra_lora_strength_high": 0.85,
+            "extra_lora_strength_low": 0.85,
         },
-    ]
+    },
+]
+
+
+@pytest.mark.parametrize("scenario", _GOLDEN_SCENARIOS, ids=lambda scenario: scenario["fixture"].removesuffix(".json"))
+def test_prompt_generation_golden_fixtures_cover_two_workflows_and_multi_try(scenario: dict[str, Any]):
+    workflow = _workflows()[scenario["workflow"]]
+    resolved = resolve_params(workflow, scenario["params"])
+    specs = build_prompts(
+        workflow,
+        scenario["input_files"],
+        resolved,
+        comfy_input_dir=Path("/tmp/task0_comfy/input"),
+        resolution=(640, 1136),
+        flip_orientation=False,
+    )
+    actual = _serialize_specs(specs)
+    expected = _read_json(FIXTURES_ROOT / "prompts" / scenario["fixture"])
+    assert actual == expected
+
 
-    for scenario in scenarios:
-        workflow = workflow_map[scenario["workflow"]]
-        resolved = resolve_params(workflow, scenario["params"])
-        specs = build_prompts(
-            workflow,
-            scenario["input_files"],
-            resolved,
-            comfy_input_dir=Path("/tmp/task0_comfy/input"),
-            resolution=(640, 1136),
-            flip_orientation=False,
-        )
-        actual = _serialize_specs(specs)
-        expected = _read_json(FIXTURES_ROOT / "prompts" / scenario["fixture"])
-        assert actual == expected
-
-
-def test_cli_list_output_snapshot(tmp_path: Path):
-    env, _, _ = _prepare_cli_env(tmp_path)
-    code, out, err = _run_cli(["list"], env)
+def test_cli_list_output_snapshot(cli_env):
+    cli, _, _ = cli_env
+    code, out, err = _run_cli(cli, ["list"])
     assert code == 0, err
 
     expected = (FIXTURES_ROOT / "cli" / "list.txt").read_text(encoding="utf-8")
     assert out == expected
 
 
-def test_cli_status_output_snapshot(tmp_path: Path):
-    env, _, _ = _prepare_cli_env(tmp_path)
-    code, out, err = _run_cli(["status"], env)
+def test_cli_status_output_snapshot(cli_env):
+    cli, _, _ = cli_env
+    code, out, err = _run_cli(cli, ["status"])
     assert code == 0, err
 
     expected = (FIXTURES_ROOT / "cli" / "status_empty.txt").read_text(encoding="utf-8")
     assert out == expected
 
 
-def test_cli_submit_dry_run_output_snapshot(tmp_path: Path):
-    env, input_dir, sample_image = _prepare_cli_env(tmp_path)
+def test_cli_submit_dry_run_output_snapshot(cli_env):
+    cli, input_dir, sample_image = cli_env
     code, out, err = _run_cli(
+        cli,
         [
             "submit",
             "--workflow",
@@ -236,7 +251,6 @@ def test_cli_submit_dry_run_output_snapshot(tmp_path: Path):
             "--param",
             "extra_lora_strength_low=0.8",
         ],
-        env,
     )
     assert code == 0, err
 
@@ -1,64 +1,77 @@
 from __future__ import annotations
 
+import functools
 from pathlib import Path
 
 
 ROOT = Path(__file__).resolve().parents[1]
 
 
+# Sources are read on first use, so tests deselected with -k never touch their files.
+@functools.lru_cache(maxsize=None)
 def _src(path: str) -> str:
     return (ROOT / path).read_text(encoding="utf-8")
 
 
-PAGE = _src("ui/src/routes/+page.svelte")
-STATUS_BAR = _src("ui/src/lib/components/StatusBar.svelte")
-SUBMIT_PANEL = _src("ui/src/lib/components/SubmitPanel/SubmitPanel.svelte")
-DROP_ZONE = _src("ui/src/lib/components/SubmitPanel/DropZone.svelte")
-QUEUE_PANEL = _src("ui/src/lib/components/Queue/QueuePanel.svelte")
-BULK_ACTIONS = _src("ui/src/lib/components/Queue/BulkActions.svelte")
-API_TS = _src("ui/src/lib/api.ts")
+PAGE = "ui/src/routes/+page.svelte"
+STATUS_BAR = "ui/src/lib/components/StatusBar.svelte"
+SUBMIT_PANEL = "ui/src/lib/components/SubmitPanel/SubmitPanel.svelte"
+DROP_ZONE = "ui/src/lib/components/SubmitPanel/DropZone.svelte"
+QUEUE_PANEL = "ui/src/lib/components/Queue/QueuePanel.svelte"
+BULK_ACTIONS = "ui/src/lib/components/Queue/BulkActions.svelte"
+API_TS = "ui/src/lib/api.ts"
 
 
 def test_v2_has_status_bar_and_quick_actions():
-    assert 'id="health"' in STATUS_BAR
-    assert 'id="pauseBtn"' in STATUS_BAR
-    assert 'id="resumeBtn"' in STATUS_BAR
-    assert 'id="reloadWfBtn"' in STATUS_BAR
-    assert 'id="reloadLoraBtn"' in STATUS_BAR
+    status_bar = _src(STATUS_BAR)
+    assert 'id="health"' in status_bar
+    assert 'id="pauseBtn"' in status_bar
+    assert 'id="resumeBtn"' in status_bar
+    assert 'id="reloadWfBtn"' in status_bar
+    assert 'id="reloadLoraBtn"' in status_bar
 
 
 def test_v2_has_submit_panel_controls():
-    assert 'id="modeBatch"' in SUBMIT_PANEL
-    assert 'id="modeImageGen"' in SUBMIT_PANEL
-    assert 'id="modeUpscale"' in SUBMIT_PANEL
-    assert 'id="modeUpscaleImg"' in SUBMIT_PANEL
-    assert 'id="workflowSelect"' in SUBMIT_PANEL
-    assert 'id="paramFields"' in SUBMIT_PANEL
-    assert 'id="submitBtn"' in SUBMIT_PANEL
+    submit_panel = _src(SUBMIT_PANEL)
+    assert 'id="modeBatch"' in submit_panel
+    assert 'id="modeImageGen"' in submit_panel
+    assert 'id="modeUpscale"' in submit_panel
+    assert 'id="modeUpscaleImg"' in submit_panel
+    assert 'id="workflowSelect"' in submit_panel
+    assert 'id="paramFields"' in submit_panel
+    assert 'id="submitBtn"' in submit_panel
 
 
 def test_v2_has_drop_upload_and_thumbnails():
-    assert 'id="dropZone"' in SUBMIT_PANEL
-    assert 'inputId="fileInput"' in SUBMIT_PANEL
-    assert 'thumbsId="thumbs"' in SUBMIT_PANEL
-    assert '/api/upload/input-image' in API_TS
-    assert 'id = \'dropZone\'' in DROP_ZONE
+    submit_panel = _src(SUBMIT_PANEL)
+    drop_zone = _src(DROP_ZONE)
+    api_ts = _src(API_TS)
+    assert 'id="dropZone"' in submit_panel
+    assert 'inputId="fileInput"' in submit_panel
+    assert 'thumbsId="thumbs"' in submit_panel
+    assert '/api/upload/input-image' in api_ts
+    assert 'id = \'dropZone\'' in drop_zone
 
 
 def test_v2_has_queue_visibility_and_safe_actions():
-    assert 'id="statusFilter"' in QUEUE_PANEL
-    assert 'id="queueSearch"' in QUEUE_PANEL
-    assert 'id="queueSort"' in QUEUE_PANEL
-    assert 'id="selectVisible"' in QUEUE_PANEL
-    assert 'id="cancelSelBtn"' in BULK_ACTIONS
-    assert 'id="clearQueueBtn"' in BULK_ACTIONS
-    assert '/api/jobs/' in API_TS
+    queue_panel = _src(QUEUE_PANEL)
+    bulk_actions = _src(BULK_ACTIONS)
+    api_ts = _src(API_TS)
+    assert 'id="statusFilter"' in queue_panel
+    assert 'id="queueSearch"' in queue_panel
+    assert 'id="queueSort"' in queue_panel
+    assert 'id="selectVisible"' in queue_panel
+    assert 'id="cancelSelBtn"' in bulk_actions
+    assert 'id="clearQueueBtn"' in bulk_actions
+    assert '/api/jobs/' in api_ts
 
 
 def test_v2_has_workspace_and_preset_controls():
-    assert 'id="workspaceTabs"' in PAGE
-    assert 'id="newWsBtn"' in PAGE
-    assert 'id="renameWsBtn"' in PAGE
-    assert 'id="closeWsBtn"' in PAGE
-    assert 'id="promptPresetSelect"' in SUBMIT_PANEL
-    assert 'id="settingsPresetSelect"' in SUBMIT_PANEL
+    page = _src(PAGE)
+    submit_panel = _src(SUBMIT_PANEL)
+    assert 'id="workspaceTabs"' in page
+    assert 'id="newWsBtn"' in page
+    assert 'id="renameWsBtn"' in page
+    assert 'id="closeWsBtn"' in page
+    assert 'id="promptPresetSelect"' in submit_panel
+    assert 'id="settingsPresetSelect"' in submit_panel
@@ -4,6 +4,14 @@ from pathlib import Path
 
 
 ROOT = Path(__file__).resolve().parents[1]
+_APP_V2_MOUNT_SNIPPETS = (
+    "self.ui_build_dir = self.root / \"ui\" / \"build\"",
+    "app.mount(\"/v2\", StaticFiles(directory=str(state.ui_build_dir), html=True), name=\"ui_v2\")",
+    "def ui_v2_unavailable()",
+    "UI V2 build not found. Run: cd ui && npm install && npm run build",
+    "def legacy_index()",
+    "index_file = state.static_dir / \"index.html\"",
+)
 
 
 def test_v2_scaffold_files_exist():
@@ -16,9 +24,5 @@ def test_v2_scaffold_files_exist():
 
 def test_app_registers_v2_mount_when_build_exists():
     app_py = (ROOT / "app.py").read_text(encoding="utf-8")
-    assert "self.ui_build_dir = self.root / \"ui\" / \"build\"" in app_py
-    assert "app.mount(\"/v2\", StaticFiles(directory=str(state.ui_build_dir), html=True), name=\"ui_v2\")" in app_py
-    assert "def ui_v2_unavailable()" in app_py
-    assert "UI V2 build not found. Run: cd ui && npm install && npm run build" in app_py
-    assert "def legacy_index()" in app_py
-    assert "index_file = state.static_dir / \"index.html\"" in app_py
+    missing = [snippet for snippet in _APP_V2_MOUNT_SNIPPETS if snippet not in app_py]
+    assert not missing
@@ -210,3 +210,66 @@ def test_cancel_after_first_prompt_completion_cancels_next_pending_prompt(tmp_pa
             worker.stop()
     finally:
         db.close()
+
+
+def test_notify_wakes_idle_worker_without_waiting_for_poll_interval(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    db = QueueDB(tmp_path / "queue.db")
+    queued = threading.Event()
+
+    def _queue_prompt(*_args, **_kwargs):
+        queued.set()
+        raise worker_mod.ComfyError("stop after pickup")
+
+    try:
+        monkeypatch.setattr(worker_mod, "health_check", lambda _base_url: True)
+        monkeypatch.setattr(worker_mod, "queue_prompt", _queue_prompt)
+
+        worker = Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)
+        worker.start()
+        try:
+            _wait_until(lambda: worker.running)
+            time.sleep(0.1)
+            _job_with_two_prompts(db)
+            worker.notify()
+            assert queued.wait(timeout=0.5)
+        finally:
+            worker.stop()
+    finally:
+        db.close()
+
+
+def test_health_backoff_is_jittered_within_base_and_cap(tmp_path: Path):
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        worker = Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)
+        waits = [worker._next_backoff() for _ in range(50)]
+        assert waits[0] <= 1.5
+        assert all(0.5 <= wait <= 60.0 for wait in waits)
+        assert max(waits) > 5.0
+    finally:
+        db.close()
+
+
+def test_stop_flushes_queued_log_writes_and_reports_failures(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+):
+    real_append_log = worker_mod._append_log
+
+    def _slow_append_log(log_path: str, blob: bytes) -> None:
+        time.sleep(0.2)
+        if log_path.endswith("_3.log"):
+            raise OSError("disk full")
+        real_append_log(log_path, blob)
+
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        monkeypatch.setattr(worker_mod, "_append_log", _slow_append_log)
+        worker = Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)
+        log_path = worker._write_log(1, 2, ["status=running", "status=succeeded"])
+        worker._write_log(1, 3, ["status=running"])
+        worker.stop()
+
+        assert Path(log_path).read_text().count("status=") == 2
+        assert "failed to write prompt log: disk full" in caplog.text
+    finally:
+        db.close()
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import errno
+import os
 from pathlib import Path
 from types import SimpleNamespace
 
+import pytest
+
+import worker as worker_mod
 from db import QueueDB
 from worker import Worker
 
@@ -45,3 +50,95 @@ def test_move_processed_skips_files_still_referenced_by_active_prompts(tmp_path:
     finally:
         db.close()
 
+
+def test_move_processed_falls_back_to_copy_across_filesystems(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    src_dir = tmp_path / "inputs"
+    src_dir.mkdir(parents=True, exist_ok=True)
+    src_file = src_dir / "a.png"
+    src_file.write_bytes(b"png")
+
+    def _cross_device(*_args, **_kwargs):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        job_id = db.create_job("wf", None, str(src_dir), {}, [_spec(str(src_file))], move_processed=True)
+        prompt = db.get_prompts_for_job(job_id)[0]
+        db.update_prompt_and_job_status(int(prompt["id"]), job_id, "succeeded")
+
+        monkeypatch.setattr(os, "replace", _cross_device)
+        Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)._move_processed(job_id)
+
+        assert (src_dir / "_processed" / "a.png").read_bytes() == b"png"
+        assert not src_file.exists()
+    finally:
+        db.close()
+
+
+def test_move_processed_uses_shutil_move_when_copy_file_range_is_refused(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    src_dir = tmp_path / "inputs"
+    src_dir.mkdir(parents=True, exist_ok=True)
+    src_file = src_dir / "a.png"
+    src_file.write_bytes(b"png")
+
+    def _cross_device(*_args, **_kwargs):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def _refuse(*_args, **_kwargs):
+        raise OSError(errno.ENOSYS, "Function not implemented")
+
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        job_id = db.create_job("wf", None, str(src_dir), {}, [_spec(str(src_file))], move_processed=True)
+        prompt = db.get_prompts_for_job(job_id)[0]
+        db.update_prompt_and_job_status(int(prompt["id"]), job_id, "succeeded")
+
+        monkeypatch.setattr(os, "replace", _cross_device)
+        monkeypatch.setattr(os, "copy_file_range", _refuse, raising=False)
+        Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)._move_processed(job_id)
+
+        assert (src_dir / "_processed" / "a.png").read_bytes() == b"png"
+        assert not src_file.exists()
+    finally:
+        db.close()
+
+
+def test_move_processed_discards_short_copy_file_range_copy(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    src_dir = tmp_path / "inputs"
+    src_dir.mkdir(parents=True, exist_ok=True)
+    src_file = src_dir / "a.png"
+    src_file.write_bytes(b"png-bytes")
+
+    def _cross_device(*_args, **_kwargs):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def _stops_early(*_args, **_kwargs):
+        return 0
+
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        job_id = db.create_job("wf", None, str(src_dir), {}, [_spec(str(src_file))], move_processed=True)
+        prompt = db.get_prompts_for_job(job_id)[0]
+        db.update_prompt_and_job_status(int(prompt["id"]), job_id, "succeeded")
+
+        monkeypatch.setattr(os, "replace", _cross_device)
+        monkeypatch.setattr(os, "copy_file_range", _stops_early, raising=False)
+        Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)._move_processed(job_id)
+
+        assert (src_dir / "_processed" / "a.png").read_bytes() == b"png-bytes"
+        assert not src_file.exists()
+    finally:
+        db.close()
+
+
+def test_move_across_devices_never_overwrites_an_existing_destination(tmp_path: Path):
+    src = tmp_path / "a.png"
+    src.write_bytes(b"new")
+    dst = tmp_path / "a_processed.png"
+    dst.write_bytes(b"old")
+
+    with pytest.raises(FileExistsError):
+        worker_mod._move_across_devices(str(src), str(dst))
+
+    assert dst.read_bytes() == b"old"
+    assert src.read_bytes() == b"new"
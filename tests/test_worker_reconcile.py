@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import worker as worker_mod
+from db import QueueDB
+from worker import Worker
+
+
+def _spec(path: str, seed: int = 1):
+    return SimpleNamespace(input_file=path, prompt_json={"name": path}, seed_used=seed)
+
+
+def test_reconcile_applies_each_history_entry_to_its_own_row(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    db = QueueDB(tmp_path / "queue.db")
+    history = {
+        "done": {"status": {"completed": True, "status_str": "success"}},
+        "broken": {"status": {"completed": False, "status_str": "error"}},
+        "busy": {"status": {"completed": False, "status_str": "running"}},
+        "gone": {},
+    }
+
+    def _get_history_entry(_base_url: str, prompt_id: str):
+        if prompt_id == "offline":
+            raise worker_mod.ComfyUnreachableError("down")
+        return history[prompt_id]
+
+    try:
+        names = ["done", "broken", "busy", "gone", "offline"]
+        job_ids = [db.create_job("wf", None, "/tmp", {}, [_spec(f"{name}.png")]) for name in names]
+        for job_id, name in zip(job_ids, names):
+            prompt = db.get_prompts_for_job(job_id)[0]
+            db.update_prompt_and_job_status(int(prompt["id"]), job_id, "running", prompt_id=name)
+
+        monkeypatch.setattr(worker_mod, "get_history_entry", _get_history_entry)
+        monkeypatch.setattr(worker_mod, "get_outputs", lambda _base_url, prompt_id: [f"{prompt_id}.mp4"])
+
+        Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)._reconcile_running_prompts_once()
+
+        statuses = {name: db.get_prompts_for_job(job_id)[0]["status"] for name, job_id in zip(names, job_ids)}
+        assert statuses == {
+            "done": "succeeded",
+            "broken": "failed",
+            "busy": "running",
+            "gone": "running",
+            "offline": "running",
+        }
+        assert db.get_prompts_for_job(job_ids[0])[0]["output_paths"] == '["done.mp4"]'
+    finally:
+        db.close()
+
+
+def test_classify_entry_maps_comfy_status_to_terminal_prompt_status():
+    assert worker_mod._classify_entry({"status": {"completed": True, "status_str": "success"}}) == (
+        "succeeded",
+        {"exit_status": "success"},
+    )
+    assert worker_mod._classify_entry({"status": {"status_str": "canceled"}}) == (
+        "canceled",
+        {"exit_status": "canceled", "error_detail": "Comfy canceled prompt"},
+    )
+    assert worker_mod._classify_entry({"status": {"status_str": "running"}}) is None
+    assert worker_mod._classify_entry({"status": "bogus"}) is None
+
+
+def test_stop_shuts_down_history_pool_and_reconcile_falls_back_to_serial(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        job_ids = [db.create_job("wf", None, "/tmp", {}, [_spec(f"{name}.png")]) for name in ("a", "b")]
+        for job_id, name in zip(job_ids, ("a", "b")):
+            prompt = db.get_prompts_for_job(job_id)[0]
+            db.update_prompt_and_job_status(int(prompt["id"]), job_id, "running", prompt_id=name)
+        monkeypatch.setattr(
+            worker_mod, "get_history_entry", lambda _base_url, _prompt_id: {"status": {"status_str": "canceled"}}
+        )
+
+        worker = Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)
+        worker.stop()
+        assert worker._history_pool is None
+
+        worker._reconcile_running_prompts_once()
+        assert {db.get_prompts_for_job(job_id)[0]["status"] for job_id in job_ids} == {"canceled"}
+    finally:
+        db.close()
+
+
+def test_failed_startup_recovery_is_retried_without_killing_the_worker(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    calls: list[int] = []
+
+    def _flaky_recover(self) -> None:
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("evicted concurrently")
+
+    db = QueueDB(tmp_path / "queue.db")
+    try:
+        db.pause()
+        monkeypatch.setattr(Worker, "_recover_inflight_prompts_on_startup", _flaky_recover)
+        worker = Worker(db, workflows={}, base_url="http://127.0.0.1:8188", data_dir=tmp_path)
+        worker.start()
+        try:
+            deadline = time.time() + 5
+            while len(calls) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            assert len(calls) == 2
+            assert worker.is_alive()
+        finally:
+            worker.stop()
+    finally:
+        db.close()
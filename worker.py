@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import errno
 import json
+import logging
+import os
+import random
 import shutil
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
@@ -22,6 +28,120 @@ from db import QueueDB, utc_now
 from defs import WorkflowDef
 
 
+_logger = logging.getLogger(__name__)
+
+_HISTORY_FETCH_WORKERS = 8
+# A Comfy response this recent stands in for the loop's /system_stats probe.
+_HEALTH_CHECK_TTL = 2.0
+# output_paths is a flat list of strings; a reusable encoder skips json.dumps' per-call setup.
+_encode_output_paths = json.JSONEncoder(check_circular=False).encode
+
+# Comfy history status_str values that end a prompt without outputs.
+_TERMINAL = {
+    "error": ("failed", "Comfy returned status=error"),
+    "failed": ("failed", "Comfy returned status=failed"),
+    "canceled": ("canceled", "Comfy canceled prompt"),
+}
+# exit_status per exception class; subclasses (e.g. ComfyTimeoutError) resolve through the MRO.
+_EXC_EXIT_STATUS: dict[type[BaseException], str] = {
+    ComfyValidationError: "validation_error",
+    ComfyUnreachableError: "unreachable",
+    ComfyError: "error",
+}
+
+
+def _exc_exit_status(exc: BaseException) -> str:
+    for cls in type(exc).__mro__:
+        exit_status = _EXC_EXIT_STATUS.get(cls)
+        if exit_status is not None:
+            return exit_status
+    return "exception"
+
+
+_log_stamp_cache: tuple[int, str] = (0, "")
+
+
+def _log_stamp() -> str:
+    # Log lines only need second resolution, so each second is formatted once.
+    global _log_stamp_cache
+    now = int(time.time())
+    if now != _log_stamp_cache[0]:
+        _log_stamp_cache = (now, datetime.fromtimestamp(now, timezone.utc).isoformat())
+    return _log_stamp_cache[1]
+
+
+def _classify_entry(entry: Any) -> tuple[str, dict[str, Any]] | None:
+    status = entry.get("status") if isinstance(entry, dict) else {}
+    status = status if isinstance(status, dict) else {}
+    status_str = str(status.get("status_str", "unknown"))
+    if status.get("completed", False):
+        return "succeeded", {"exit_status": status_str}
+    terminal = _TERMINAL.get(status_str)
+    if terminal is None:
+        return None
+    new_status, error_detail = terminal
+    return new_status, {"exit_status": status_str, "error_detail": error_detail}
+
+
+def _append_log(log_path: str, blob: bytes) -> None:
+    fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, blob)
+    finally:
+        os.close(fd)
+
+
+def _new_history_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=_HISTORY_FETCH_WORKERS, thread_name_prefix="comfy-history")
+
+
+def _new_log_pool() -> ThreadPoolExecutor:
+    # One writer thread keeps log appends in submit order and off the scheduling loop.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker-log")
+
+
+def _report_log_failure(future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        _logger.error("failed to write prompt log: %s", exc)
+
+
+def _move_across_devices(src: str, dst: str) -> None:
+    # copy_file_range keeps the copy in the kernel (server-side or reflinked where the filesystem can);
+    # shutil.move covers kernels and filesystem pairs that refuse it.
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        shutil.move(src, dst)
+        return
+    created = False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+            created = True
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    # Short copy (source shrank or the filesystem declined): never trust a partial dst.
+                    raise OSError(errno.EIO, "copy_file_range stopped before end of file", src)
+                remaining -= copied
+    except FileExistsError:
+        # Someone else's file already sits at dst; never let the fallback overwrite it.
+        raise
+    except OSError:
+        if created:
+            os.unlink(dst)
+        shutil.move(src, dst)
+        return
+    try:
+        shutil.copystat(src, dst)
+    except OSError:
+        os.unlink(dst)
+        raise
+    os.unlink(src)
+
+
 class Worker:
     def __init__(
         self,
@@ -36,13 +156,19 @@ class Worker:
         self.data_dir = Path(data_dir).expanduser().resolve()
         self.logs_dir = self.data_dir / "logs"
         self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self._logs_dir_s = str(self.logs_dir)
 
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
         self._thread: threading.Thread | None = None
         self._state_lock = threading.Lock()
         self._running = False
-        self._backoff_idx = 0
-        self._backoff_steps = [5, 10, 30, 60]
+        self._backoff_base = 0.5
+        self._backoff_cap = 60.0
+        self._backoff_prev = 0.0
+        self._comfy_ok_at = 0.0
+        self._history_pool: ThreadPoolExecutor | None = _new_history_pool()
+        self._log_pool: ThreadPoolExecutor | None = _new_log_pool()
 
     @property
     def running(self) -> bool:
@@ -53,6 +179,10 @@ class Worker:
         if self._thread and self._thread.is_alive():
             return
         self._stop_event.clear()
+        if self._history_pool is None:
+            self._history_pool = _new_history_pool()
+        if self._log_pool is None:
+            self._log_pool = _new_log_pool()
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
         self._thread.start()
 
@@ -61,15 +191,42 @@ class Worker:
 
     def stop(self, timeout: float = 10.0) -> None:
         self._stop_event.set()
+        self._wake_event.set()
         if self._thread:
             self._thread.join(timeout=timeout)
+        if self._history_pool is not None:
+            self._history_pool.shutdown(wait=True)
+            self._history_pool = None
+        # Flush log appends still queued so every recorded log_path exists after shutdown.
+        if self._log_pool is not None:
+            self._log_pool.shutdown(wait=True)
+            self._log_pool = None
+
+    def notify(self) -> None:
+        # Called by the API after enqueue/resume/retry so an idle loop picks up work immediately.
+        self._wake_event.set()
+
+    def _idle(self, timeout: float) -> None:
+        if self._wake_event.wait(timeout):
+            self._wake_event.clear()
+
+    def _next_backoff(self) -> float:
+        # Decorrelated jitter: quick first retry, capped growth, no lockstep between workers.
+        self._backoff_prev = min(
+            self._backoff_cap,
+            random.uniform(self._backoff_base, max(self._backoff_base, self._backoff_prev) * 3),
+        )
+        return self._backoff_prev
 
     def _write_log(self, job_id: int, prompt_row_id: int, lines: list[str]) -> str:
-        log_path = self.logs_dir / f"{job_id}_{prompt_row_id}.log"
-        with log_path.open("a", encoding="utf-8") as f:
-            for line in lines:
-                f.write(f"{utc_now()} {line}\n")
-        return str(log_path)
+        log_path = os.path.join(self._logs_dir_s, f"{job_id}_{prompt_row_id}.log")
+        ts = _log_stamp()
+        blob = "".join(f"{ts} {line}\n" for line in lines).encode("utf-8")
+        if self._log_pool is None:
+            _append_log(log_path, blob)
+        else:
+            self._log_pool.submit(_append_log, log_path, blob).add_done_callback(_report_log_failure)
+        return log_path
 
     def _move_processed(self, job_id: int) -> None:
         detail = self.db.get_job(job_id)
@@ -81,61 +238,77 @@ class Worker:
         if job.get("status") != "succeeded":
             return
 
-        source_dir = Path(job["input_dir"]).expanduser().resolve()
-        processed_dir = source_dir / "_processed"
-        processed_dir.mkdir(parents=True, exist_ok=True)
+        source_dir = os.path.realpath(os.path.expanduser(job["input_dir"]))
+        processed_dir = os.path.join(source_dir, "_processed")
+        os.makedirs(processed_dir, exist_ok=True)
 
-        seen: set[str] = set()
-        for prompt in detail["prompts"]:
-            src = str(prompt.get("input_file") or "").strip()
-            if not src:
-                continue
-            if src in seen:
-                continue
-            seen.add(src)
+        # Tries of one input share input_file; dict keeps first-seen order while de-duplicating.
+        sources = dict.fromkeys(str(prompt.get("input_file") or "").strip() for prompt in detail["prompts"])
+        sources.pop("", None)
+        # One directory scan per input dir instead of a stat per file.
+        files_by_dir: dict[str, set[str]] = {}
+        for src in sources:
             # Do not move files still referenced by queued/running prompts in other jobs.
             if self.db.has_active_prompts_for_input(src, exclude_job_id=job_id):
                 continue
-            src_path = Path(src)
-            if not src_path.exists() or not src_path.is_file():
+            parent, name = os.path.split(src)
+            present = files_by_dir.get(parent)
+            if present is None:
+                try:
+                    present = {entry.name for entry in os.scandir(parent or ".") if entry.is_file()}
+                except OSError:
+                    present = set()
+                files_by_dir[parent] = present
+            if name not in present:
                 continue
-            dst = processed_dir / src_path.name
-            if dst.exists():
-                dst = processed_dir / f"{src_path.stem}_{int(time.time())}{src_path.suffix}"
+            dst = os.path.join(processed_dir, name)
+            if os.path.exists(dst):
+                stem, suffix = os.path.splitext(name)
+                dst = os.path.join(processed_dir, f"{stem}_{int(time.time())}{suffix}")
             try:
-                shutil.move(str(src_path), str(dst))
-            except Exception:
-                continue
+                os.replace(src, dst)
+            except OSError as exc:
+                # Inputs normally live on the same filesystem as _processed; copy only across devices.
+                if exc.errno != errno.EXDEV:
+                    continue
+                try:
+                    _move_across_devices(src, dst)
+                except Exception:
+                    continue
 
     def _run_loop(self) -> None:
         with self._state_lock:
             self._running = True
 
-        self._recover_inflight_prompts_on_startup()
+        recovered = False
         try:
             while not self._stop_event.is_set():
                 try:
+                    if not recovered:
+                        # Inside the guard so a failed recovery is retried instead of killing the thread.
+                        self._recover_inflight_prompts_on_startup()
+                        recovered = True
+
                     if self.db.is_paused():
-                        time.sleep(1.0)
+                        self._idle(1.0)
                         continue
 
-                    if not health_check(self.base_url):
-                        wait_s = self._backoff_steps[min(self._backoff_idx, len(self._backoff_steps) - 1)]
-                        self._backoff_idx = min(self._backoff_idx + 1, len(self._backoff_steps) - 1)
-                        time.sleep(wait_s)
-                        continue
+                    if time.monotonic() - self._comfy_ok_at >= _HEALTH_CHECK_TTL:
+                        if not health_check(self.base_url):
+                            self._stop_event.wait(self._next_backoff())
+                            continue
+                        self._comfy_ok_at = time.monotonic()
 
                     self._reconcile_running_prompts_once()
-                    self._backoff_idx = 0
-                    row = self.db.next_pending_prompt()
+                    self._backoff_prev = 0.0
+                    row = self.db.claim_next_prompt()
                     if not row:
-                        time.sleep(1.0)
+                        self._idle(1.0)
                         continue
 
                     prompt_row_id = int(row["id"])
                     job_id = int(row["job_id"])
-                    job_detail = self.db.get_job(job_id)
-                    if not job_detail:
+                    if not self.db.get_job_row(job_id):
                         self.db.update_prompt_status(prompt_row_id, "failed", error_detail="missing parent job")
                         continue
 
@@ -143,91 +316,43 @@ class Worker:
 
                     # Cancel-after-current semantics: if cancel was requested before execution
                     # of this pending row, mark it canceled and skip queueing to ComfyUI.
-                    if self.db.is_cancel_requested(job_id):
-                        self.db.update_prompt_status(
-                            prompt_row_id,
-                            "canceled",
-                            finished_at=utc_now(),
-                            error_detail="canceled before execution",
-                        )
-                        self.db.update_job_status(job_id)
+                    if self.db.try_cancel_pending(prompt_row_id, job_id):
                         continue
 
-                    self.db.update_prompt_status(prompt_row_id, "running", started_at=utc_now())
-                    self.db.update_job_status(job_id)
-
                     log_lines = [f"prompt_row={prompt_row_id} status=running"]
+                    final_status = "failed"
+                    final_fields: dict[str, Any]
                     try:
                         comfy_prompt_id = queue_prompt(self.base_url, prompt_json)
                         log_lines.append(f"queued prompt_id={comfy_prompt_id}")
                         self.db.update_prompt_status(prompt_row_id, "running", prompt_id=comfy_prompt_id)
 
                         ok, status = poll_until_done(self.base_url, comfy_prompt_id)
+                        self._comfy_ok_at = time.monotonic()
                         if ok:
                             output_paths = get_outputs(self.base_url, comfy_prompt_id)
-                            self.db.update_prompt_status(
-                                prompt_row_id,
-                                "succeeded",
-                                finished_at=utc_now(),
-                                exit_status=status,
-                                output_paths=json.dumps(output_paths),
-                            )
+                            final_fields = {"exit_status": status, "output_paths": _encode_output_paths(output_paths)}
+                            final_status = "succeeded"
                             log_lines.append(f"status=succeeded prompt_id={comfy_prompt_id}")
                         else:
-                            self.db.update_prompt_status(
-                                prompt_row_id,
-                                "failed",
-                                finished_at=utc_now(),
-                                exit_status=status,
-                                error_detail=f"Comfy returned status={status}",
-                            )
+                            final_fields = {"exit_status": status, "error_detail": f"Comfy returned status={status}"}
                             log_lines.append(f"status=failed prompt_id={comfy_prompt_id} detail={status}")
 
-                    except ComfyValidationError as exc:
-                        self.db.update_prompt_status(
-                            prompt_row_id,
-                            "failed",
-                            finished_at=utc_now(),
-                            exit_status="validation_error",
-                            error_detail=str(exc),
-                        )
-                        log_lines.append(f"status=failed validation_error={exc}")
-                    except ComfyUnreachableError as exc:
-                        self.db.update_prompt_status(
-                            prompt_row_id,
-                            "failed",
-                            finished_at=utc_now(),
-                            exit_status="unreachable",
-                            error_detail=str(exc),
-                        )
-                        log_lines.append(f"status=failed unreachable={exc}")
-                    except ComfyError as exc:
-                        self.db.update_prompt_status(
-                            prompt_row_id,
-                            "failed",
-                            finished_at=utc_now(),
-                            exit_status="error",
-                            error_detail=str(exc),
-                        )
-                        log_lines.append(f"status=failed error={exc}")
                     except Exception as exc:
-                        self.db.update_prompt_status(
-                            prompt_row_id,
-                            "failed",
-                            finished_at=utc_now(),
-                            exit_status="exception",
-                            error_detail=str(exc),
-                        )
-                        log_lines.append(f"status=failed exception={exc}")
+                        self._comfy_ok_at = 0.0
+                        exit_status = _exc_exit_status(exc)
+                        final_fields = {"exit_status": exit_status, "error_detail": str(exc)}
+                        log_lines.append(f"status=failed {exit_status}={exc}")
 
                     log_path = self._write_log(job_id, prompt_row_id, log_lines)
-                    self.db.conn.execute("UPDATE jobs SET log_path=? WHERE id=?", (log_path, job_id))
-                    self.db.conn.commit()
-
-                    if self.db.is_cancel_requested(job_id):
-                        self.db.cancel_pending_prompts(job_id)
-
-                    job_status = self.db.update_job_status(job_id)
+                    job_status = self.db.finalize_prompt(
+                        prompt_row_id,
+                        job_id,
+                        final_status,
+                        log_path=log_path,
+                        finished_at=utc_now(),
+                        **final_fields,
+                    )
                     if job_status == "succeeded":
                         self._move_processed(job_id)
                 except Exception:
@@ -239,71 +364,63 @@ class Worker:
             with self._state_lock:
                 self._running = False
 
-    def _reconcile_running_prompts_once(self) -> None:
-        running_rows = self.db.list_running_prompts()
-        if not running_rows:
-            return
-
+    def _fetch_history_entries(self, prompt_ids: list[str]) -> list[Any]:
+        # Overlaps the per-prompt /history round-trips; a ComfyError is returned in place of
+        # its entry so callers can apply DB updates serially on this thread.
+        def fetch(prompt_id: str) -> Any:
+            try:
+                return get_history_entry(self.base_url, prompt_id)
+            except ComfyError as exc:
+                return exc
+
+        if len(prompt_ids) <= 1 or self._history_pool is None:
+            return [fetch(prompt_id) for prompt_id in prompt_ids]
+        return list(self._history_pool.map(fetch, prompt_ids))
+
+    def _track_running_prompts(
+        self, running_rows: list[dict[str, Any]], missing_prompt_id_detail: str
+    ) -> list[tuple[dict[str, Any], str, Any]]:
+        tracked: list[tuple[dict[str, Any], str]] = []
         for row in running_rows:
-            prompt_row_id = int(row["id"])
-            job_id = int(row["job_id"])
             comfy_prompt_id = str(row.get("prompt_id") or "").strip()
             if not comfy_prompt_id:
-                self.db.update_prompt_status(
-                    prompt_row_id,
+                self.db.update_prompt_and_job_status(
+                    int(row["id"]),
+                    int(row["job_id"]),
                     "failed",
                     finished_at=utc_now(),
                     exit_status="interrupted",
-                    error_detail="running row had no prompt_id after restart",
+                    error_detail=missing_prompt_id_detail,
                 )
-                self.db.update_job_status(job_id)
-                continue
-
-            try:
-                entry = get_history_entry(self.base_url, comfy_prompt_id)
-            except ComfyError:
                 continue
+            tracked.append((row, comfy_prompt_id))
+
+        entries = self._fetch_history_entries([comfy_prompt_id for _, comfy_prompt_id in tracked])
+        return [(row, comfy_prompt_id, entry) for (row, comfy_prompt_id), entry in zip(tracked, entries)]
+
+    def _apply_history_entry(self, row: dict[str, Any], comfy_prompt_id: str, entry: Any) -> bool:
+        outcome = _classify_entry(entry)
+        if outcome is None:
+            return False
+        status, fields = outcome
+        if status == "succeeded":
+            fields["output_paths"] = _encode_output_paths(get_outputs(self.base_url, comfy_prompt_id))
+        self.db.update_prompt_and_job_status(
+            int(row["id"]), int(row["job_id"]), status, finished_at=utc_now(), **fields
+        )
+        return True
 
-            if not entry:
-                continue
-
-            status = entry.get("status") if isinstance(entry, dict) else {}
-            status = status if isinstance(status, dict) else {}
-            completed = bool(status.get("completed", False))
-            status_str = str(status.get("status_str", "unknown"))
-
-            if completed:
-                output_paths = get_outputs(self.base_url, comfy_prompt_id)
-                self.db.update_prompt_status(
-                    prompt_row_id,
-                    "succeeded",
-                    finished_at=utc_now(),
-                    exit_status=status_str,
-                    output_paths=json.dumps(output_paths),
-                )
-                self.db.update_job_status(job_id)
-                continue
-
-            if status_str in {"error", "failed"}:
-                self.db.update_prompt_status(
-                    prompt_row_id,
-                    "failed",
-                    finished_at=utc_now(),
-                    exit_status=status_str,
-                    error_detail=f"Comfy returned status={status_str}",
-                )
-                self.db.update_job_status(job_id)
-                continue
+    def _reconcile_running_prompts_once(self) -> None:
+        # Every running row is treated as this worker's own; only one Worker may drain a queue DB.
+        running_rows = self.db.list_running_prompts()
+        if not running_rows:
+            return
 
-            if status_str == "canceled":
-                self.db.update_prompt_status(
-                    prompt_row_id,
-                    "canceled",
-                    finished_at=utc_now(),
-                    exit_status=status_str,
-                    error_detail="Comfy canceled prompt",
-                )
-                self.db.update_job_status(job_id)
+        for row, comfy_prompt_id, entry in self._track_running_prompts(
+            running_rows, "running row had no prompt_id after restart"
+        ):
+            if entry and not isinstance(entry, ComfyError):
+                self._apply_history_entry(row, comfy_prompt_id, entry)
 
     def _recover_inflight_prompts_on_startup(self) -> None:
         running_rows = self.db.list_running_prompts()
@@ -316,75 +433,23 @@ class Worker:
         except ComfyError:
             queue_ids = None
 
-        for row in running_rows:
-            prompt_row_id = int(row["id"])
-            job_id = int(row["job_id"])
-            comfy_prompt_id = str(row.get("prompt_id") or "").strip()
-            if not comfy_prompt_id:
-                self.db.update_prompt_status(
-                    prompt_row_id,
-                    "failed",
-                    finished_at=utc_now(),
-                    exit_status="interrupted",
-                    error_detail="interrupted (missing prompt_id)",
-                )
-                self.db.update_job_status(job_id)
-                continue
-
-            try:
-                entry = get_history_entry(self.base_url, comfy_prompt_id)
-            except ComfyError:
+        for row, comfy_prompt_id, entry in self._track_running_prompts(running_rows, "interrupted (missing prompt_id)"):
+            if isinstance(entry, ComfyError):
                 # Keep as running when Comfy is unavailable at startup.
                 continue
-
-            if entry:
-                status = entry.get("status") if isinstance(entry, dict) else {}
-                status = status if isinstance(status, dict) else {}
-                completed = bool(status.get("completed", False))
-                status_str = str(status.get("status_str", "unknown"))
-                if completed:
-                    output_paths = get_outputs(self.base_url, comfy_prompt_id)
-                    self.db.update_prompt_status(
-                        prompt_row_id,
-                        "succeeded",
-                        finished_at=utc_now(),
-                        exit_status=status_str,
-                        output_paths=json.dumps(output_paths),
-                    )
-                    self.db.update_job_status(job_id)
-                    continue
-                if status_str in {"error", "failed"}:
-                    self.db.update_prompt_status(
-                        prompt_row_id,
-                        "failed",
-                        finished_at=utc_now(),
-                        exit_status=status_str,
-                        error_detail=f"Comfy returned status={status_str}",
-                    )
-                    self.db.update_job_status(job_id)
-                    continue
-                if status_str == "canceled":
-                    self.db.update_prompt_status(
-                        prompt_row_id,
-                        "canceled",
-                        finished_at=utc_now(),
-                        exit_status=status_str,
-                        error_detail="Comfy canceled prompt",
-                    )
-                    self.db.update_job_status(job_id)
-                    continue
+            if entry and self._apply_history_entry(row, comfy_prompt_id, entry):
+                continue
 
             # If Comfy queue endpoint is available and prompt is not active and no history entry,
             # treat it as interrupted. Otherwise keep running and let periodic reconciliation resolve it.
             if queue_ids is not None and comfy_prompt_id not in queue_ids:
-                self.db.update_prompt_status(
-                    prompt_row_id,
+                self.db.update_prompt_and_job_status(
+                    int(row["id"]),
+                    int(row["job_id"]),
                     "failed",
                     finished_at=utc_now(),
                     exit_status="interrupted",
                     error_detail="interrupted (not found in Comfy queue/history after restart)",
                 )
-                self.db.update_job_status(job_id)
-
 
 __all__ = ["Worker"]